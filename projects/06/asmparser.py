@@ -1,24 +1,36 @@
 class ASMParser():
     def __init__(self, input_file):
-        with open(input_file) as file:
-            # Reads lines of input into a list
-            lines = file.readlines()
-        # TODO: refactor so that advance goes line by line without reading the whole file into memory
+        # input_file is either a path to a .asm file or an iterable of assembly lines
+        # Lines are read lazily from the file, so only the current line is held in memory
+        self.file_reader = self.make_reader(input_file)
+        # Holds the line after the current instruction once has_more_lines() has peeked at it
+        self.lookahead = None
 
         # Initializes parser to line 0, with no instruction loaded
-        self.input = lines
         self.next_line = 0
         self.inst_line = 0
         self.cur_inst = None
 
 
+    def make_reader(self, input_file):
+        """
+        Create generator which returns lines from input_file
+        """
+        if not isinstance(input_file, str):
+            yield from input_file
+            return
+        with open(input_file) as file:
+            for line in file:
+                yield line
+
+
     def has_more_lines(self):
         """
         Returns true if next_line exists
         """
-        if self.next_line < len(self.input):
-            return True
-        return False
+        if self.lookahead is None:
+            self.lookahead = next(self.file_reader, None)
+        return self.lookahead is not None
 
 
     def advance(self):
@@ -36,15 +48,14 @@ class ASMParser():
         # whitespace before lines is ignored
         # empty lines are also ignored
         while self.has_more_lines():
-            current_line = self.input[self.next_line]
+            current_line = self.lookahead
+            self.lookahead = None
+            self.next_line += 1
             if "//" in current_line:
                 current_line = current_line[0:current_line.find("//")]
             current_line = current_line.strip()
-            if len(current_line) == 0:
-                self.next_line += 1
-            else:
+            if len(current_line) != 0:
                 self.cur_inst = current_line
-                self.next_line += 1
                 # Only increment instruction line if it is not a loop label
                 if self.cur_inst[0] != '(':
                     self.inst_line += 1
@@ -131,5 +142,6 @@ class ASMParser():
 
 
     def __str__(self):
-        join_str = ""
-        return join_str.join(self.input)
\ No newline at end of file
+        if self.cur_inst is None:
+            return ""
+        return self.cur_inst
@@ -1,119 +1,351 @@
+import io
 import sys
 import code
+import rom
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from asmparser import ASMParser as Parser
+from symbol_map import SymbolMap, SYMBOL_MAP_EXTENSION
 
 # Location for start of symbol addresses, initialize to 16
 SYMBOL_MEM_INDEX_START = 16
+# Number of distinct instruction strings kept by the encoding cache
+ENCODING_CACHE_SIZE = 4096
+# Number of source lines given to each worker by assemble_parallel
+CHUNK_LINES = 100000
+
+
+class EncodingCache():
+    """
+    Bounded LRU cache from the text of an instruction to its machine word.
+    Generated code repeats the same instructions many times over, so most lines
+    can be encoded with a single dictionary lookup instead of being re-parsed.
+    hits and misses count the lookups made with get().
+    """
+    def __init__(self, maxsize=ENCODING_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.words = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+    def get(self, inst):
+        """
+        Returns the cached word for inst, or None if inst is not cached
+        """
+        word = self.words.get(inst)
+        if word is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.words.move_to_end(inst)
+        return word
+
+
+    def put(self, inst, word):
+        """
+        Caches word for inst, evicting the least recently used entry when full
+        """
+        self.words[inst] = word
+        if len(self.words) > self.maxsize:
+            self.words.popitem(last=False)
+
 
 def main():
     # Check for proper usage
-    if len(sys.argv) != 2:
-        print("Incorrect number of arguments")
-        sys.exit("Usage: python assembler.py file.asm")
+    options = sys.argv[2:]
+    if (len(sys.argv) < 2
+            or any(option not in ['--binary', '--parallel', '--symbols', '--lines'] for option in options)):
+        print("Incorrect arguments")
+        sys.exit("Usage: python assembler.py file.asm [--binary] [--parallel] [--symbols] [--lines]")
+    binary = '--binary' in options
+
+    # --symbols writes a symbol map, --lines adds the source line index to it
+    if '--symbols' in options or '--lines' in options:
+        symbol_map = SymbolMap(with_lines='--lines' in options)
+    else:
+        symbol_map = None
+
+    if '--parallel' in options:
+        # Assemble chunks of the input on all cores
+        if symbol_map is not None and symbol_map.lines is not None:
+            sys.exit("--lines is not supported with --parallel")
+        words = assemble_parallel(sys.argv[1], symbol_map=symbol_map)
+    else:
+        # Perform assembly in a single pass over the input
+        words = assemble(Parser(sys.argv[1]), code.Code(), symbol_map=symbol_map)
+
+    if symbol_map is not None:
+        symbol_map.write(sys.argv[1][:-3] + SYMBOL_MAP_EXTENSION)
+
+    # Binary output packs each word into 2 bytes, text output writes one line per word
+    if binary:
+        out_file_name = sys.argv[1][:-3] + rom.ROM_EXTENSION
+        rom.write_rom(words, out_file_name)
+    else:
+        out_file_name = sys.argv[1][:-3] + 'hack'
+        with open(out_file_name, 'w') as out:
+            for word in words:
+                out.write(word_to_binary(word) + '\n')
+
+def assemble_source(source, cache=None):
+    """
+    Assembles a program in memory without reading or writing any files.
+    source is either the assembly text or an iterable of assembly lines.
+    cache is an optional EncodingCache, see assemble().
+
+    Returns: array('H') of machine words, one per instruction
+    """
+    if isinstance(source, str):
+        source = io.StringIO(source)
+    return assemble(Parser(source), code.Code(), cache)
+
+def assemble(parser, my_code, cache=None, symbol_map=None):
+    """
+    Assembles the program in a single pass over the parser.
+    Words are emitted as instructions are read. An A-instruction that references
+    a symbol which is not yet known is emitted as a placeholder and recorded as a
+    forward reference. When the (LABEL) for that symbol is found, every recorded
+    reference is patched with the label's address. Symbols which are never defined
+    as labels are variables, and are allocated from SYMBOL_MEM_INDEX_START in the
+    order of their first use.
+    C-instructions, numbers and predefined symbols are kept in cache, so repeated
+    instructions skip the parser. Labels are always looked up in this program's
+    symbol table, so an EncodingCache can be shared between programs, or passed in
+    to read its hit and miss counts afterwards. Otherwise a new one is used.
+    If a SymbolMap is given, the labels and variables are recorded in it,
+    along with the source line index if the map has one.
+
+    Returns: array('H') of machine words, one per instruction
+    """
+    if cache is None:
+        cache = EncodingCache()
+    predefined = get_symbols()
+    symbol_table = get_symbols()
+    words = array('H')
+    # Forward references: symbol -> indexes of the words which are waiting for it
+    unresolved = {}
+    record_lines = symbol_map is not None and symbol_map.lines is not None
+
+    while parser.advance():
+        if record_lines:
+            symbol_map.add_line(parser.next_line, len(words))
+
+        # Only words which are the same in every program are cached
+        if parser.cur_inst[0] != '(':
+            word = cache.get(parser.cur_inst)
+            if word is not None:
+                words.append(word)
+                continue
+
+        if parser.instruction_type() == 'L':
+            symbol = parser.symbol()
+            if symbol not in symbol_table and symbol[0] not in '0123456789':
+                # bind loop label symbols to the next instruction line and
+                # backpatch any references made before the label was found
+                symbol_table[symbol] = len(words)
+                if symbol_map is not None:
+                    symbol_map.labels[symbol] = len(words)
+                for index in unresolved.pop(symbol, []):
+                    words[index] = a_instruction(len(words))
+        else:
+            word = translate(parser, my_code, symbol_table)
+            if word is None:
+                unresolved.setdefault(parser.symbol(), []).append(len(words))
+                word = 0
+            elif is_program_independent(parser, predefined):
+                cache.put(parser.cur_inst, word)
+            words.append(word)
 
-    # Instantiate parser
-    my_parser = Parser(sys.argv[1])
+    # Any symbol still unresolved was not a label, so it is a variable
+    symbol_mem_index = SYMBOL_MEM_INDEX_START
+    for symbol, indexes in unresolved.items():
+        symbol_table[symbol] = symbol_mem_index
+        if symbol_map is not None:
+            symbol_map.variables[symbol] = symbol_mem_index
+        for index in indexes:
+            words[index] = a_instruction(symbol_mem_index)
+        symbol_mem_index += 1
+
+    return words
+
+def assemble_parallel(input_file, max_workers=None, chunk_lines=CHUNK_LINES, symbol_map=None):
+    """
+    Assembles the program by splitting the input into chunks of chunk_lines lines.
+    Each chunk is scanned for labels and encoded by assemble_chunk on a process pool,
+    then merge_chunks resolves the symbols. The result is identical to assemble().
+    symbol_map is passed on to merge_chunks.
+
+    Returns: array('H') of machine words, one per instruction
+    """
+    with open(input_file) as file:
+        chunks = iter(lambda: list(islice(file, chunk_lines)), [])
+        with ProcessPoolExecutor(max_workers) as executor:
+            return merge_chunks(executor.map(assemble_chunk, chunks), symbol_map)
+
+def assemble_chunk(lines):
+    """
+    Encodes a chunk of the program without knowing the rest of it.
+    Only predefined symbols and numbers are resolved. Every other A-instruction is
+    left as a placeholder and recorded as a reference for merge_chunks.
 
-    # Initialize translation dictionaries
+    Returns:
+        tuple (array('H'), dict, list)
+        (words, label -> index of the word it points at, [(word index, symbol)])
+    """
+    parser = Parser(lines)
     my_code = code.Code()
+    cache = EncodingCache()
+    predefined = get_symbols()
+    words = array('H')
+    labels = {}
+    references = []
 
-    # Initialize symbol table and populate with symbols by making a first pass
-    symbol_table = get_symbols(Parser(sys.argv[1]));
+    while parser.advance():
+        if parser.cur_inst[0] != '(':
+            word = cache.get(parser.cur_inst)
+            if word is not None:
+                words.append(word)
+                continue
+
+        if parser.instruction_type() == 'L':
+            symbol = parser.symbol()
+            if symbol not in predefined and symbol not in labels and symbol[0] not in '0123456789':
+                labels[symbol] = len(words)
+        else:
+            word = translate(parser, my_code, predefined)
+            if word is None:
+                references.append((len(words), parser.symbol()))
+                word = 0
+            else:
+                cache.put(parser.cur_inst, word)
+            words.append(word)
 
-    # Test translation into binary
-    # while my_parser.advance():
-    #     if my_parser.instruction_type() == 'C':
-    #         print(f"{my_parser.inst_line}  {my_parser.cur_inst}   \t| Type: {my_parser.instruction_type()} \t| Dest: {my_parser.dest()}  Comp: {my_parser.comp()}  Jump: {my_parser.jump()} \t | Translation: {translate(my_parser, my_code, symbol_table)}")
-    #     else:
-    #         print(f"{my_parser.inst_line}  {my_parser.cur_inst}   \t| Type: {my_parser.instruction_type()} \t| Symbol: {my_parser.symbol()} \t\t\t | Translation: {translate(my_parser, my_code, symbol_table)}")
+    return (words, labels, references)
+
+def merge_chunks(chunks, symbol_map=None):
+    """
+    Joins the results of assemble_chunk, in program order, into the final program.
+    Labels are offset by the position of their chunk, with the first definition of
+    a label taking precedence. References are then resolved in program order, so
+    variables are allocated from SYMBOL_MEM_INDEX_START in the order of their first use.
+    If a SymbolMap is given, the labels and variables are recorded in it.
+    Source lines are not known here, so its line index is left alone.
+
+    Returns: array('H') of machine words, one per instruction
+    """
+    symbol_table = get_symbols()
+    words = array('H')
+    references = []
+
+    for chunk_words, labels, chunk_references in chunks:
+        base = len(words)
+        for symbol, index in labels.items():
+            if symbol not in symbol_table:
+                symbol_table[symbol] = base + index
+                if symbol_map is not None:
+                    symbol_map.labels[symbol] = base + index
+        references.append((base, chunk_references))
+        words.extend(chunk_words)
 
     symbol_mem_index = SYMBOL_MEM_INDEX_START
+    for base, chunk_references in references:
+        for index, symbol in chunk_references:
+            address = symbol_table.get(symbol)
+            if address is None:
+                # Not a label, so it is a variable
+                address = symbol_mem_index
+                symbol_table[symbol] = address
+                if symbol_map is not None:
+                    symbol_map.variables[symbol] = address
+                symbol_mem_index += 1
+            words[base + index] = a_instruction(address)
 
-    # Open output file for writing
-    out_file_name = sys.argv[1][:-3] + 'hack'
+    return words
 
-    # Perform assembly and write out results line by line
-    with open(out_file_name, 'w') as out:
-        while my_parser.advance():
-            # Skip any lines with loop instructions
-            if my_parser.cur_inst[0] != '(':
-                translate_out = translate(my_parser, my_code, symbol_table, symbol_mem_index)
-                symbol_mem_index = translate_out[1]
-                out.write(translate_out[0] + '\n')
+def is_program_independent(parser, predefined):
+    """
+    Returns True if the current instruction encodes to the same word in any program:
+    a C-instruction, or an A-instruction with a number or a predefined symbol
+    """
+    if parser.instruction_type() == 'C':
+        return True
+    symbol = parser.symbol()
+    return symbol in predefined or symbol[0] in '0123456789'
 
-def translate(parser, my_code, symbol_table, symbol_mem_index):
+def translate(parser, my_code, symbol_table):
     """
-    Translates a line into binary
+    Translates a line into a machine word
     Returns:
-        tuple (str, int)
-        (16 digit binary string, new_symbol_mem_index)
+        int: 16 bit machine word
+        None if the line is an A-instruction whose symbol is not in symbol_table yet
     """
     if parser.instruction_type() == 'C':
-        dest_bin = my_code.dest(parser.dest())
-        comp_bin = my_code.comp(parser.comp())
-        jump_bin = my_code.jump(parser.jump())
-        return ("111" + comp_bin + dest_bin + jump_bin, symbol_mem_index)
+        return (code.C_PREFIX
+                | my_code.comp(parser.comp())
+                | my_code.dest(parser.dest())
+                | my_code.jump(parser.jump()))
     else:
         symbol = parser.symbol()
         if symbol in symbol_table:
-            return ('0' + int_to_binary(int(symbol_table.get(symbol))), symbol_mem_index)
+            return a_instruction(symbol_table[symbol])
         elif symbol[0] in '0123456789':
-            return ('0' + int_to_binary(int(symbol)), symbol_mem_index)
+            return a_instruction(int(symbol))
         else:
-            symbol_table[symbol] = symbol_mem_index
-            symbol_mem_index += 1
-            return ('0' + int_to_binary(int(symbol_table.get(symbol))), symbol_mem_index)
-
-def get_symbols(sym_parser):
-    # Allocate predefined symbols
-    sym_table = {
-        'R0' : '0',
-        'R1' : '1',
-        'R2' : '2',
-        'R3' : '3',
-        'R4' : '4',
-        'R5' : '5',
-        'R5' : '5',
-        'R6' : '6',
-        'R7' : '7',
-        'R8' : '8',
-        'R9' : '9',
-        'R10' : '10',
-        'R11' : '11',
-        'R12' : '12',
-        'R13' : '13',
-        'R14' : '14',
-        'R15' : '15',
-        'SCREEN' : '16384',
-        'KBD' : '24576',
-        'SP' : '0',
-        'LCL' : '1',
-        'ARG' : '2',
-        'THIS' : '3',
-        'THAT' : '4'
+            return None
+
+def get_symbols():
+    """
+    Returns a new symbol table holding the predefined symbols
+    """
+    return {
+        'R0' : 0,
+        'R1' : 1,
+        'R2' : 2,
+        'R3' : 3,
+        'R4' : 4,
+        'R5' : 5,
+        'R6' : 6,
+        'R7' : 7,
+        'R8' : 8,
+        'R9' : 9,
+        'R10' : 10,
+        'R11' : 11,
+        'R12' : 12,
+        'R13' : 13,
+        'R14' : 14,
+        'R15' : 15,
+        'SCREEN' : 16384,
+        'KBD' : 24576,
+        'SP' : 0,
+        'LCL' : 1,
+        'ARG' : 2,
+        'THIS' : 3,
+        'THAT' : 4
     }
-    # Do a parser pass to get loop labels
-    while sym_parser.advance():
-        if sym_parser.instruction_type() != 'C':
-            if sym_parser.cur_inst[0] == '(':
-                symbol = sym_parser.symbol()
-                if symbol not in sym_table and symbol[0] not in '0123456789':
-                    # bind loop label symbols to their instruction line
-                    sym_table[symbol] = sym_parser.inst_line
-    return sym_table
 
-def int_to_binary(value: (int)):
+def a_instruction(value: (int)):
     """
-    Translates a string representation of an integer into a binary string
+    Translates an integer into an A-instruction word
 
-    Returns: str
+    Returns: int
     """
     if value > 32767:
         raise ValueError("value must be <= 32767")
     elif value < 0:
         raise ValueError("value must be >= 0")
 
-    return f"{value:015b}"
+    return value
+
+def word_to_binary(word: (int)):
+    """
+    Translates a machine word into a 16 digit binary string
+
+    Returns: str
+    """
+    return f"{word:016b}"
 
 if __name__ == "__main__":
     main();
@@ -0,0 +1,180 @@
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import code
+import rom
+from assembler import assemble, assemble_chunk, merge_chunks, word_to_binary
+from asmparser import ASMParser as Parser
+
+EXIT_MESSAGE = "Usage: python benchmark.py [max_synthetic_instructions]"
+
+# Programs shipped with project 6, relative to this file
+SHIPPED_PROGRAMS = [
+    os.path.join('add', 'Add.asm'),
+    os.path.join('max', 'Max.asm'),
+    os.path.join('rect', 'Rect.asm'),
+    os.path.join('pong', 'Pong.asm'),
+    os.path.join('pong', 'PongL.asm')
+]
+# Sizes of the generated programs, in instructions
+SYNTHETIC_SIZES = [10000, 100000, 1000000, 10000000]
+# Small programs are timed several times and the fastest run is kept
+SMALL_PROGRAM_REPEATS = 5
+SMALL_PROGRAM_SIZE = 100000
+# Number of blocks in a synthetic program which define labels
+LABEL_BLOCKS = 1000
+
+
+def main():
+    # Check for proper usage
+    if len(sys.argv) > 2:
+        print("Incorrect number of arguments")
+        sys.exit(EXIT_MESSAGE)
+    max_size = int(sys.argv[1]) if len(sys.argv) == 2 else SYNTHETIC_SIZES[-1]
+
+    results = []
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    for program in SHIPPED_PROGRAMS:
+        results.append(benchmark_file(os.path.join(base_dir, program), program))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in SYNTHETIC_SIZES:
+            if size > max_size:
+                break
+            file_name = os.path.join(tmp_dir, f"Synthetic{size}.asm")
+            write_synthetic_program(file_name, size)
+            results.append(benchmark_file(file_name, f"synthetic-{size}"))
+            os.remove(file_name)
+
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+def benchmark_file(file_name, name):
+    """
+    Times each stage of the assembler on file_name.
+    parse: reading and classifying every line with ASMParser
+    encode: assemble_chunk, which encodes without resolving symbols, less the parse time
+    symbols: merge_chunks, which binds labels and allocates variables
+    output: writing the .hack text, and the packed binary ROM
+    total: the single pass assembler, assemble()
+    peak_memory_bytes is the largest traced allocation total during assemble().
+
+    Returns: dict of results, times in seconds
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        hack_file_name = os.path.join(tmp_dir, 'out.hack')
+        bin_file_name = os.path.join(tmp_dir, 'out.' + rom.ROM_EXTENSION)
+
+        parse_time = best_time(file_name, lambda: parse(file_name))
+        chunk_time = best_time(file_name, lambda: assemble_file_chunk(file_name))
+        chunk = assemble_file_chunk(file_name)
+        symbols_time = best_time(file_name, lambda: merge_chunks([chunk]))
+        words = merge_chunks([chunk])
+        output_time = best_time(file_name, lambda: write_hack(words, hack_file_name))
+        binary_output_time = best_time(file_name, lambda: rom.write_rom(words, bin_file_name))
+        total_time = best_time(file_name, lambda: assemble(Parser(file_name), code.Code()))
+
+    tracemalloc.start()
+    assemble(Parser(file_name), code.Code())
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    instructions = len(words)
+    return {
+        'program': name,
+        'instructions': instructions,
+        'parse_s': parse_time,
+        'encode_s': max(chunk_time - parse_time, 0.0),
+        'symbols_s': symbols_time,
+        'output_s': output_time,
+        'binary_output_s': binary_output_time,
+        'total_s': total_time,
+        'instructions_per_s': instructions / total_time if total_time else None,
+        'peak_memory_bytes': peak_memory
+    }
+
+
+def best_time(file_name, stage):
+    """
+    Returns the fastest of the timed runs of stage, in seconds
+    """
+    with open(file_name) as file:
+        small = sum(1 for _ in file) < SMALL_PROGRAM_SIZE
+    repeats = SMALL_PROGRAM_REPEATS if small else 1
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        stage()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def parse(file_name):
+    """
+    Reads and classifies every line of file_name without encoding it
+    """
+    parser = Parser(file_name)
+    while parser.advance():
+        parser.instruction_type()
+
+
+def assemble_file_chunk(file_name):
+    """
+    Returns assemble_chunk run over the whole of file_name
+    """
+    with open(file_name) as file:
+        return assemble_chunk(file)
+
+
+def write_hack(words, out_file_name):
+    """
+    Writes words as .hack text, as assembler.main does
+    """
+    with open(out_file_name, 'w') as out:
+        for word in words:
+            out.write(word_to_binary(word) + '\n')
+
+
+def write_synthetic_program(out_file_name, size):
+    """
+    Writes a program of size instructions shaped like VM translator output:
+    stack pushes and pops, static variables, comparisons with forward jumps,
+    and function labels with backward jumps.
+    A-instructions can only hold 15 bit addresses, so labels are only defined in the
+    first LABEL_BLOCKS blocks and later blocks jump back into them.
+    """
+    block = 0
+    written = 0
+    with open(out_file_name, 'w') as out:
+        while written < size:
+            label = block % LABEL_BLOCKS
+            lines = [
+                "@SP", "AM=M-1", "D=M",
+                f"@Synthetic.{block % 240}", "M=D",
+                f"@Synthetic.{(block + 1) % 240}", "D=M",
+                "@SP", "M=M+1", "A=M-1", "M=D",
+                "@SP", "AM=M-1", "D=M", "A=A-1", "D=M-D", "M=-1",
+                f"@gtTrue{label}", "D;JGT",
+                "@SP", "A=M-1", "M=0",
+                "@LCL", "D=M", "@R13", "M=D",
+                f"@Synthetic.f{label // 2}", "D;JNE",
+                f"@Synthetic.f{(label + 1) % LABEL_BLOCKS}", "0;JMP"
+            ]
+            if block < LABEL_BLOCKS:
+                lines.insert(0, f"(Synthetic.f{label})")
+                lines.insert(lines.index("@LCL"), f"(gtTrue{label})")
+            for line in lines:
+                if line[0] != '(':
+                    if written == size:
+                        break
+                    written += 1
+                out.write(line + '\n')
+            block += 1
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import re
+import sys
+import time
+from emulator import (Emulator, load_program, alu_expression, EXIT_MESSAGE,
+                      ROM_SIZE, KBD, ADDRESS_MASK)
+
+# Longest run of straight-line code compiled into one block
+MAX_BLOCK_LENGTH = 256
+
+# Condition on the ALU output out for each value of the jump bits, None for no jump
+JUMP_CONDITIONS = [
+    None,
+    "0 < out < 0x8000",
+    "out == 0",
+    "out < 0x8000",
+    "out >= 0x8000",
+    "out != 0",
+    "out == 0 or out >= 0x8000",
+    "True"
+]
+
+
+def main():
+    # Check for proper usage
+    if len(sys.argv) != 3:
+        print("Incorrect number of arguments")
+        sys.exit(EXIT_MESSAGE.replace("emulator.py", "block_emulator.py"))
+
+    emulator = BlockEmulator(load_program(sys.argv[1]))
+    emulator.run(int(sys.argv[2]))
+    print(f"{emulator.cycles} cycles in {emulator.elapsed:.3f} s "
+          f"({emulator.cycles_per_second():.0f} cycles/s)")
+    print(f"PC: {emulator.pc}  A: {emulator.a}  D: {emulator.d}")
+
+
+class BlockEmulator(Emulator):
+    """
+    Emulator which translates the ROM into Python functions one basic block at a time.
+    A block starts wherever execution enters the ROM and runs up to and including the
+    next jump, so blocks split at every jump and jump target that is used.
+    Each block is compiled once, on first entry, with the A, D and PC updates inlined
+    and addresses which are known from a preceding @value folded into constants.
+    The compiled blocks are dropped whenever a new ROM is loaded.
+    """
+    def load(self, words):
+        Emulator.load(self, words)
+        self.invalidate()
+
+
+    def invalidate(self):
+        """
+        Drops every compiled block. Call after changing rom or program directly.
+        """
+        # pc -> (function, number of instructions), compiled on first entry
+        self.blocks = [None] * ROM_SIZE
+
+
+    def run(self, cycles):
+        """
+        Executes cycles instructions, a block at a time.
+        When fewer cycles remain than the next block holds, the remainder is
+        executed one instruction at a time.
+
+        Returns: int, the number of cycles executed
+        """
+        blocks = self.blocks
+        mem = self.mem
+        a = self.a
+        d = self.d
+        pc = self.pc
+        remaining = cycles
+        start = time.perf_counter()
+
+        while True:
+            block = blocks[pc]
+            if block is None:
+                block = blocks[pc] = self.compile_block(pc)
+            function, length = block
+            if length > remaining:
+                break
+            a, d, pc = function(mem, a, d)
+            remaining -= length
+
+        self.elapsed += time.perf_counter() - start
+        self.a = a
+        self.d = d
+        self.pc = pc
+        self.cycles += cycles - remaining
+        if remaining:
+            Emulator.run(self, remaining)
+        return cycles
+
+
+    def compile_block(self, start):
+        """
+        Compiles the block starting at ROM address start
+
+        Returns: tuple (function, int)
+        (function of (mem, a, d) returning (a, d, pc), number of instructions)
+        """
+        lines = [f"def block_{start}(mem, a, d):"]
+        # Value of A at this point of the block, if it is a known constant
+        known_a = None
+        pc = start
+        ends_with_jump = False
+
+        while pc < ROM_SIZE and pc - start < MAX_BLOCK_LENGTH:
+            word = int(self.rom[pc])
+            pc += 1
+            if word & 0x8000 == 0:
+                lines.append(f"    a = {word}")
+                known_a = word
+                continue
+
+            comp_bits = (word >> 6) & 0x7F
+            dest_bits = (word >> 3) & 0b111
+            jump_bits = word & 0b111
+            address = "addr" if known_a is None else str(known_a & ADDRESS_MASK)
+            if known_a is None and (comp_bits & 0x40 or dest_bits & 0b001 or jump_bits):
+                lines.append(f"    addr = a & {ADDRESS_MASK}")
+
+            y = f"mem[{address}]" if comp_bits & 0x40 else "a"
+            expression = re.sub(r"\by\b", y, alu_expression(comp_bits))
+            # The common D=... and A=... forms need no temporary
+            if not jump_bits and dest_bits in [0b010, 0b100]:
+                register = "d" if dest_bits == 0b010 else "a"
+                lines.append(f"    {register} = {expression}")
+                if register == "a":
+                    known_a = None
+                continue
+
+            lines.append(f"    out = {expression}")
+            if dest_bits & 0b001:
+                if known_a is None:
+                    lines.append(f"    if addr != {KBD}:")
+                    lines.append("        mem[addr] = out")
+                elif known_a & ADDRESS_MASK != KBD:
+                    lines.append(f"    mem[{address}] = out")
+            if dest_bits & 0b010:
+                lines.append("    d = out")
+            if dest_bits & 0b100:
+                lines.append("    a = out")
+                known_a = None
+
+            if jump_bits:
+                condition = JUMP_CONDITIONS[jump_bits]
+                next_pc = pc & ADDRESS_MASK
+                if condition == "True":
+                    lines.append(f"    return a, d, {address}")
+                else:
+                    lines.append(f"    if {condition}:")
+                    lines.append(f"        return a, d, {address}")
+                    lines.append(f"    return a, d, {next_pc}")
+                ends_with_jump = True
+                break
+
+        if not ends_with_jump:
+            lines.append(f"    return a, d, {pc & ADDRESS_MASK}")
+
+        namespace = {}
+        exec(compile("\n".join(lines), f"<block {start}>", "exec"), namespace)
+        return (namespace[f"block_{start}"], pc - start)
+
+
+if __name__ == "__main__":
+    main()
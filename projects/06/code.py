@@ -1,76 +1,89 @@
+# Bit positions of the C-instruction fields: 111a cccc ccdd djjj
+C_PREFIX = 0b111 << 13
+COMP_SHIFT = 6
+DEST_SHIFT = 3
+JUMP_SHIFT = 0
+
 class Code():
     def __init__(self):
         self.dest_dic = {
-            ''  : '000',
-            'M' : '001',
-            'D' : '010',
-            'DM' : '011',
-            'MD' : '011',
-            'A' : '100',
-            'AM' : '101',
-            'AD' : '110',
-            'ADM' : '111'
+            ''  : 0b000 << DEST_SHIFT,
+            'M' : 0b001 << DEST_SHIFT,
+            'D' : 0b010 << DEST_SHIFT,
+            'DM' : 0b011 << DEST_SHIFT,
+            'MD' : 0b011 << DEST_SHIFT,
+            'A' : 0b100 << DEST_SHIFT,
+            'AM' : 0b101 << DEST_SHIFT,
+            'AD' : 0b110 << DEST_SHIFT,
+            'ADM' : 0b111 << DEST_SHIFT
         }
 
         self.jump_dic = {
-            '' : '000',
-            'JGT' : '001',
-            'JEQ' : '010',
-            'JGE' : '011',
-            'JLT' : '100',
-            'JNE' : '101',
-            'JLE' : '110',
-            'JMP' : '111'
+            '' : 0b000 << JUMP_SHIFT,
+            'JGT' : 0b001 << JUMP_SHIFT,
+            'JEQ' : 0b010 << JUMP_SHIFT,
+            'JGE' : 0b011 << JUMP_SHIFT,
+            'JLT' : 0b100 << JUMP_SHIFT,
+            'JNE' : 0b101 << JUMP_SHIFT,
+            'JLE' : 0b110 << JUMP_SHIFT,
+            'JMP' : 0b111 << JUMP_SHIFT
         }
 
         self.comp_dict = {
-            '0' : '0101010',
-            '1' : '0111111',
-            '-1' : '0111010',
-            'D' : '0001100',
-            'A' : '0110000',
-            'M' : '1110000',
-            '!D' : '0001101',
-            '!A' : '0110001',
-            '!M' : '1110001',
-            '-D' : '0001111',
-            '-A' : '0110011',
-            '-M' : '1110011',
-            'D+1' : '0011111',
-            'A+1' : '0110111',
-            'M+1' : '1110111',
-            'D-1' : '0001110',
-            'A-1' : '0110010',
-            'M-1' : '1110010',
-            'D+A' : '0000010',
-            'D+M' : '1000010',
-            'D-A' : '0010011',
-            'D-M' : '1010011',
-            'A-D' : '0000111',
-            'M-D' : '1000111',
-            'D&A' : '0000000',
-            'D&M' : '1000000',
-            'D|A' : '0010101',
-            'D|M' : '1010101'
+            '0' : 0b0101010 << COMP_SHIFT,
+            '1' : 0b0111111 << COMP_SHIFT,
+            '-1' : 0b0111010 << COMP_SHIFT,
+            'D' : 0b0001100 << COMP_SHIFT,
+            'A' : 0b0110000 << COMP_SHIFT,
+            'M' : 0b1110000 << COMP_SHIFT,
+            '!D' : 0b0001101 << COMP_SHIFT,
+            '!A' : 0b0110001 << COMP_SHIFT,
+            '!M' : 0b1110001 << COMP_SHIFT,
+            '-D' : 0b0001111 << COMP_SHIFT,
+            '-A' : 0b0110011 << COMP_SHIFT,
+            '-M' : 0b1110011 << COMP_SHIFT,
+            'D+1' : 0b0011111 << COMP_SHIFT,
+            'A+1' : 0b0110111 << COMP_SHIFT,
+            'M+1' : 0b1110111 << COMP_SHIFT,
+            'D-1' : 0b0001110 << COMP_SHIFT,
+            'A-1' : 0b0110010 << COMP_SHIFT,
+            'M-1' : 0b1110010 << COMP_SHIFT,
+            'D+A' : 0b0000010 << COMP_SHIFT,
+            'D+M' : 0b1000010 << COMP_SHIFT,
+            'D-A' : 0b0010011 << COMP_SHIFT,
+            'D-M' : 0b1010011 << COMP_SHIFT,
+            'A-D' : 0b0000111 << COMP_SHIFT,
+            'M-D' : 0b1000111 << COMP_SHIFT,
+            'D&A' : 0b0000000 << COMP_SHIFT,
+            'D&M' : 0b1000000 << COMP_SHIFT,
+            'D|A' : 0b0010101 << COMP_SHIFT,
+            'D|M' : 0b1010101 << COMP_SHIFT,
+            # Operands of the commutative operations may be written in either order
+            'A+D' : 0b0000010 << COMP_SHIFT,
+            'M+D' : 0b1000010 << COMP_SHIFT,
+            'A&D' : 0b0000000 << COMP_SHIFT,
+            'M&D' : 0b1000000 << COMP_SHIFT,
+            'A|D' : 0b0010101 << COMP_SHIFT,
+            'M|D' : 0b1010101 << COMP_SHIFT
         }
 
 
     def dest(self, dest_val):
         """
-        Returns the binary translation of dest_value
+        Returns the pre-shifted instruction bits of dest_value
         """
         return self.dest_dic[dest_val]
 
 
     def jump(self, jump_val):
         """
-        Returns the binary translation of jump_value
+        Returns the pre-shifted instruction bits of jump_value
         """
         return self.jump_dic[jump_val]
 
 
     def comp(self, comp_val):
         """
-        Returns the binary translation of comp_val
+        Returns the pre-shifted instruction bits of comp_val
         """
         return self.comp_dict[comp_val]
\ No newline at end of file
@@ -0,0 +1,126 @@
+import sys
+import code
+import rom
+from symbol_map import read_symbol_map
+
+EXIT_MESSAGE = "Usage: python disassembler.py file.hack|file.bin [file.sym]"
+
+
+def main():
+    # Check for proper usage
+    if len(sys.argv) not in [2, 3]:
+        print("Incorrect number of arguments")
+        sys.exit(EXIT_MESSAGE)
+
+    # Label and variable names are restored from the symbol map written by the assembler
+    labels = None
+    variables = None
+    if len(sys.argv) == 3:
+        symbol_map = read_symbol_map(sys.argv[2])
+        labels = symbol_map.labels
+        variables = symbol_map.variables
+
+    for line in disassemble(rom.read_words(sys.argv[1]), labels, variables):
+        print(line)
+
+
+def build_decode_table():
+    """
+    Builds the text of every possible 16 bit word from the inverse of the Code tables,
+    so decoding a word is a single list index.
+    Words with the C-instruction prefix but no valid comp field decode to None.
+
+    Returns: list of 65536 str
+    """
+    my_code = code.Code()
+    # Inverting keeps the last entry for a value, so MD is used over DM
+    dest_names = {bits: name for name, bits in my_code.dest_dic.items()}
+    jump_names = {bits: name for name, bits in my_code.jump_dic.items()}
+    # comp keeps the first entry instead, so D+A is used over A+D
+    comp_names = {}
+    for name, bits in my_code.comp_dict.items():
+        comp_names.setdefault(bits, name)
+
+    # A-instructions are the words with the top bit clear
+    table = [f"@{word}" for word in range(1 << 15)]
+    table.extend([None] * (1 << 15))
+    for comp_bits, comp in comp_names.items():
+        for dest_bits, dest in dest_names.items():
+            for jump_bits, jump in jump_names.items():
+                inst = comp
+                if dest:
+                    inst = dest + '=' + inst
+                if jump:
+                    inst = inst + ';' + jump
+                table[code.C_PREFIX | comp_bits | dest_bits | jump_bits] = inst
+    return table
+
+
+# Shared by every call to disassemble
+DECODE_TABLE = build_decode_table()
+
+# Fields of the C-instruction after an A-instruction which show how the A value is used
+JUMP_BITS = 0b111 << code.JUMP_SHIFT
+READS_M_BIT = 0x40 << code.COMP_SHIFT
+WRITES_M_BIT = 0b001 << code.DEST_SHIFT
+
+
+def disassemble(words, labels=None, variables=None):
+    """
+    Translates machine words back into Hack assembly.
+    labels is an optional map of label -> ROM address. Each label is written as (LABEL)
+    before the instruction at its address. An A-instruction which loads a label's
+    address is written as @LABEL only when the next instruction jumps, since the same
+    value is just as often a constant or a RAM address.
+    variables is an optional map of variable -> RAM address. An A-instruction which
+    loads a variable's address is written as @variable when the next instruction
+    reads or writes M and does not jump.
+    Words which are not valid instructions are written as comments.
+
+    Returns: list of str, one line per word and label
+    """
+    table = DECODE_TABLE
+    if not labels and not variables:
+        lines = [table[word] for word in words]
+        if None in lines:
+            lines = [fix_invalid(line, word) for line, word in zip(lines, words)]
+        return lines
+
+    label_lines = {}
+    # The first label found for an address is the one used by A-instructions
+    label_names = {}
+    for label, address in (labels or {}).items():
+        label_lines.setdefault(address, []).append(f"({label})")
+        label_names.setdefault(address, label)
+    variable_names = {address: variable for variable, address in (variables or {}).items()}
+
+    lines = []
+    for address, word in enumerate(words):
+        if address in label_lines:
+            lines.extend(label_lines.pop(address))
+        line = fix_invalid(table[word], word)
+        if word & 0x8000 == 0 and address + 1 < len(words):
+            next_word = words[address + 1]
+            if next_word & code.C_PREFIX == code.C_PREFIX:
+                if next_word & JUMP_BITS:
+                    line = "@" + label_names.get(word, str(word))
+                elif next_word & (READS_M_BIT | WRITES_M_BIT):
+                    line = "@" + variable_names.get(word, str(word))
+        lines.append(line)
+    # Labels may point just past the last instruction
+    for address in sorted(label_lines):
+        lines.extend(label_lines[address])
+    return lines
+
+
+def fix_invalid(line, word):
+    """
+    Returns line, or a comment holding the word in binary if line is None
+    """
+    if line is None:
+        return f"// invalid instruction {word:016b}"
+    return line
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import os
+import sys
+import time
+import numpy as np
+import code
+import rom
+from assembler import assemble_source
+
+EXIT_MESSAGE = "Usage: python emulator.py file.hack|file.bin|file.asm cycles"
+
+# Memory map, as in projects/05 Memory.hdl
+ROM_SIZE = 32768
+RAM_SIZE = 32768
+SCREEN = 16384
+KBD = 24576
+# Addresses, A and the PC are 15 bits wide
+ADDRESS_MASK = 0x7FFF
+WORD_MASK = 0xFFFF
+
+# Jump bits of a decoded C-instruction, tested against the ALU output
+JUMP_IF_ZERO = 0b001
+JUMP_IF_POSITIVE = 0b010
+JUMP_IF_NEGATIVE = 0b100
+
+
+def main():
+    # Check for proper usage
+    if len(sys.argv) != 3:
+        print("Incorrect number of arguments")
+        sys.exit(EXIT_MESSAGE)
+
+    emulator = Emulator(load_program(sys.argv[1]))
+    emulator.run(int(sys.argv[2]))
+    print(f"{emulator.cycles} cycles in {emulator.elapsed:.3f} s "
+          f"({emulator.cycles_per_second():.0f} cycles/s)")
+    print(f"PC: {emulator.pc}  A: {emulator.a}  D: {emulator.d}")
+
+
+def alu_expression(comp_bits):
+    """
+    Returns the Python expression computed by the ALU for the 7 comp bits of a
+    C-instruction, in terms of d (the D register) and y (A, or M when the a-bit is set).
+    The result is a 16 bit unsigned value.
+    """
+    # The mnemonics of the Code table translate directly into Python
+    for name, bits in COMP_NAMES.items():
+        if bits == comp_bits:
+            expression = name.replace('D', 'd').replace('A', 'y').replace('M', 'y').replace('!', '~')
+            return f"({expression}) & {WORD_MASK}"
+
+    # Anything else is built from the zx nx zy ny f no control bits of the ALU
+    zx, nx, zy, ny, f, no = [(comp_bits >> shift) & 1 for shift in range(5, -1, -1)]
+    x = "0" if zx else "d"
+    if nx:
+        x = f"({x} ^ {WORD_MASK})"
+    y = "0" if zy else "y"
+    if ny:
+        y = f"({y} ^ {WORD_MASK})"
+    out = f"({x} + {y})" if f else f"({x} & {y})"
+    if no:
+        out = f"({out} ^ {WORD_MASK})"
+    return f"{out} & {WORD_MASK}"
+
+
+# comp mnemonic -> 7 comp bits, unshifted
+COMP_NAMES = {name: bits >> code.COMP_SHIFT for name, bits in code.Code().comp_dict.items()}
+# The ALU as a function of (d, y) for each of the 128 values of the comp bits
+ALU_FUNCTIONS = [eval(f"lambda d, y: {alu_expression(bits)}") for bits in range(128)]
+
+
+def decode(word):
+    """
+    Splits a machine word into the fields used by the emulator.
+
+    Returns:
+        int: the value of an A-instruction
+        tuple (bool, function, bool, bool, bool, int) for a C-instruction
+        (reads M, ALU function, writes A, writes D, writes M, jump bits)
+    """
+    if word & 0x8000 == 0:
+        return word
+    comp_bits = (word >> code.COMP_SHIFT) & 0x7F
+    dest_bits = (word >> code.DEST_SHIFT) & 0b111
+    jump_bits = (word >> code.JUMP_SHIFT) & 0b111
+    # Reorder the JLT JEQ JGT bits to match JUMP_IF_*
+    jump = ((JUMP_IF_NEGATIVE if jump_bits & 0b100 else 0)
+            | (JUMP_IF_ZERO if jump_bits & 0b010 else 0)
+            | (JUMP_IF_POSITIVE if jump_bits & 0b001 else 0))
+    return (bool(comp_bits & 0x40),
+            ALU_FUNCTIONS[comp_bits],
+            bool(dest_bits & 0b100),
+            bool(dest_bits & 0b010),
+            bool(dest_bits & 0b001),
+            jump)
+
+
+def load_program(file_name):
+    """
+    Returns the machine words of a .hack, .bin or .asm file.
+    A .asm file is assembled in memory.
+    """
+    if os.path.splitext(file_name)[1] == '.asm':
+        with open(file_name) as file:
+            return assemble_source(file)
+    return rom.read_words(file_name)
+
+
+class Emulator():
+    """
+    Headless Hack computer, following the CPU and Memory of project 5.
+    ram is a 32K uint16 NumPy array. signed_ram() views the same memory as int16.
+    The ROM is decoded once when it is loaded, and run() executes it cycle by cycle.
+    Writes to KBD are ignored, since the keyboard is read-only.
+    """
+    def __init__(self, words=()):
+        self.ram = np.zeros(RAM_SIZE, dtype=np.uint16)
+        # Python ints are read from and written to the array through this view
+        self.mem = memoryview(self.ram)
+        self.a = 0
+        self.d = 0
+        self.pc = 0
+        self.cycles = 0
+        self.elapsed = 0.0
+        self.load(words)
+
+
+    def load(self, words):
+        """
+        Loads words into ROM and decodes them. The rest of ROM is filled with 0 (@0).
+        """
+        words = list(words)
+        if len(words) > ROM_SIZE:
+            raise ValueError(f"Program has {len(words)} instructions, ROM holds {ROM_SIZE}")
+        self.rom = np.zeros(ROM_SIZE, dtype=np.uint16)
+        self.rom[:len(words)] = words
+        self.program = [decode(word) for word in words] + [0] * (ROM_SIZE - len(words))
+
+
+    def reset(self):
+        """
+        Sets the PC to 0, like the reset input of the CPU
+        """
+        self.pc = 0
+
+
+    def signed_ram(self):
+        """
+        Returns RAM viewed as int16 values, sharing memory with ram
+        """
+        return self.ram.view(np.int16)
+
+
+    def run(self, cycles):
+        """
+        Executes cycles instructions
+
+        Returns: int, the number of cycles executed
+        """
+        program = self.program
+        mem = self.mem
+        a = self.a
+        d = self.d
+        pc = self.pc
+        start = time.perf_counter()
+
+        for _ in range(cycles):
+            inst = program[pc]
+            if inst.__class__ is int:
+                a = inst
+                pc = (pc + 1) & ADDRESS_MASK
+                continue
+
+            reads_m, alu, dest_a, dest_d, dest_m, jump = inst
+            address = a & ADDRESS_MASK
+            out = alu(d, mem[address] if reads_m else a)
+            if dest_m and address != KBD:
+                mem[address] = out
+            if dest_d:
+                d = out
+            if dest_a:
+                a = out
+            # The jump target is the value A held before this instruction
+            if jump and jump & (JUMP_IF_ZERO if out == 0
+                                else JUMP_IF_NEGATIVE if out & 0x8000
+                                else JUMP_IF_POSITIVE):
+                pc = address
+            else:
+                pc = (pc + 1) & ADDRESS_MASK
+
+        self.elapsed += time.perf_counter() - start
+        self.a = a
+        self.d = d
+        self.pc = pc
+        self.cycles += cycles
+        return cycles
+
+
+    def cycles_per_second(self):
+        """
+        Returns the average speed of all calls to run()
+        """
+        if self.elapsed == 0:
+            return 0.0
+        return self.cycles / self.elapsed
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import json
+import struct
+import sys
+import zlib
+from block_emulator import BlockEmulator
+from emulator import load_program, KBD
+from snapshot import rom_checksum
+
+EXIT_MESSAGE = ("Usage: python keyboard.py file.hack|file.bin|file.asm cycles keys.txt [out.session]\n"
+                "       python keyboard.py file.hack|file.bin|file.asm in.session")
+
+# Cycles between the state checksums of a recorded session
+CHECKPOINT_INTERVAL = 100000
+
+# Key codes of the Hack keyboard, for keys named in a key script
+KEY_CODES = {
+    'RELEASE': 0, 'SPACE': 32, 'NEWLINE': 128, 'ENTER': 128, 'BACKSPACE': 129,
+    'LEFT': 130, 'UP': 131, 'RIGHT': 132, 'DOWN': 133, 'HOME': 134, 'END': 135,
+    'PAGEUP': 136, 'PAGEDOWN': 137, 'INSERT': 138, 'DELETE': 139, 'ESC': 140
+}
+KEY_CODES.update({f"F{number}": 140 + number for number in range(1, 13)})
+
+
+def main():
+    # Check for proper usage
+    if len(sys.argv) not in [3, 4, 5]:
+        print("Incorrect number of arguments")
+        sys.exit(EXIT_MESSAGE)
+
+    emulator = BlockEmulator(load_program(sys.argv[1]))
+    if len(sys.argv) == 3:
+        passed, message = replay_session(emulator, read_session(sys.argv[2]))
+        print(f"{'PASS' if passed else 'FAIL'} {sys.argv[2]}{': ' + message if message else ''}")
+        if not passed:
+            sys.exit(1)
+        return
+
+    with open(sys.argv[3]) as file:
+        events = parse_key_script(file)
+    if len(sys.argv) == 5:
+        write_session(record_session(emulator, events, int(sys.argv[2])), sys.argv[4])
+    else:
+        run_with_keys(emulator, events, int(sys.argv[2]))
+    print(f"{emulator.cycles} cycles in {emulator.elapsed:.3f} s "
+          f"({emulator.cycles_per_second():.0f} cycles/s)")
+
+
+def parse_key(text):
+    """
+    Returns the Hack key code for a key name, a single character or a number
+    """
+    if text.upper() in KEY_CODES:
+        return KEY_CODES[text.upper()]
+    if len(text) == 1 and not text.isdigit():
+        return ord(text)
+    return int(text)
+
+
+def parse_key_script(lines):
+    """
+    Parses a key script. Each line holds a cycle count and the key which is held
+    from that cycle on, such as "150000 LEFT" or "200000 a".
+    RELEASE (or 0) lets go of the keyboard. // starts a comment.
+
+    Returns: list of tuples (cycle, key code), sorted by cycle
+    """
+    events = []
+    for number, line in enumerate(lines, 1):
+        line = line.split('//')[0].strip()
+        if not line:
+            continue
+        fields = line.split()
+        if len(fields) != 2:
+            raise ValueError(f"Line {number}: expected a cycle and a key, got {line!r}")
+        events.append((int(fields[0]), parse_key(fields[1])))
+    # The sort is stable, so of several events on one cycle the last one wins
+    return sorted(events, key=lambda event: event[0])
+
+
+def state_checksum(emulator):
+    """
+    Returns the CRC-32 of the emulator's A, D, PC and RAM
+    """
+    registers = struct.pack('<HHH', emulator.a, emulator.d, emulator.pc)
+    return zlib.crc32(emulator.ram.astype('<u2').tobytes(), zlib.crc32(registers))
+
+
+def run_with_keys(emulator, events, cycles, checkpoint_interval=None):
+    """
+    Runs emulator for cycles cycles, writing the key of each event to KBD once the
+    emulator's cycle count reaches the event's cycle. Between events the emulator
+    runs at full speed. On a resumed run, events before the current cycle only
+    leave their last key held.
+    With checkpoint_interval, the state checksum is taken whenever the cycle count
+    is a multiple of it, and at the end.
+
+    Returns: list of tuples (cycle, state checksum)
+    """
+    end = emulator.cycles + cycles
+    checkpoints = []
+    index = 0
+    while True:
+        while index < len(events) and events[index][0] <= emulator.cycles:
+            emulator.ram[KBD] = events[index][1]
+            index += 1
+        if emulator.cycles == end:
+            break
+
+        stop = end
+        if index < len(events):
+            stop = min(stop, events[index][0])
+        if checkpoint_interval:
+            stop = min(stop, (emulator.cycles // checkpoint_interval + 1) * checkpoint_interval)
+        emulator.run(stop - emulator.cycles)
+        if checkpoint_interval and emulator.cycles % checkpoint_interval == 0 and emulator.cycles != end:
+            checkpoints.append((emulator.cycles, state_checksum(emulator)))
+
+    if checkpoint_interval:
+        checkpoints.append((end, state_checksum(emulator)))
+    return checkpoints
+
+
+def record_session(emulator, events, cycles, checkpoint_interval=CHECKPOINT_INTERVAL):
+    """
+    Runs emulator from its current state with the key events and records the run
+
+    Returns: dict with the ROM checksum, the starting cycle, the cycles run,
+    the events and the checkpoints
+    """
+    start_checksum = state_checksum(emulator)
+    start = emulator.cycles
+    return {
+        'rom': rom_checksum(emulator),
+        'start': start,
+        'start_state': start_checksum,
+        'cycles': cycles,
+        'events': events,
+        'checkpoint_interval': checkpoint_interval,
+        'checkpoints': run_with_keys(emulator, events, cycles, checkpoint_interval)
+    }
+
+
+def replay_session(emulator, session):
+    """
+    Replays a session recorded by record_session on emulator, which must hold the
+    same program in the same starting state, and compares every checkpoint
+
+    Returns: tuple (bool, str)
+    (True if the replay is bit-exact, message describing the first difference)
+    """
+    if rom_checksum(emulator) != session['rom']:
+        return (False, "the session was recorded with a different program")
+    if emulator.cycles != session['start'] or state_checksum(emulator) != session['start_state']:
+        return (False, "the emulator is not in the state the session started from")
+
+    checkpoints = run_with_keys(emulator, session['events'], session['cycles'],
+                                session['checkpoint_interval'])
+    for (cycle, checksum), (_, expected) in zip(checkpoints, session['checkpoints']):
+        if checksum != expected:
+            return (False, f"state differs at cycle {cycle}")
+    return (True, "")
+
+
+def write_session(session, out_file_name):
+    """
+    Writes a session returned by record_session to out_file_name as JSON
+    """
+    with open(out_file_name, 'w') as out:
+        json.dump(session, out)
+
+
+def read_session(in_file_name):
+    """
+    Reads a session file written by write_session
+    """
+    with open(in_file_name) as file:
+        session = json.load(file)
+    session['events'] = [(cycle, key) for cycle, key in session['events']]
+    session['checkpoints'] = [(cycle, checksum) for cycle, checksum in session['checkpoints']]
+    return session
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import json
+import os
+import sys
+import rom
+from array import array
+from assembler import assemble_chunk, a_instruction, word_to_binary, SYMBOL_MEM_INDEX_START
+
+# Relocatable object files hold one assembled .asm unit
+OBJECT_EXTENSION = 'obj'
+
+EXIT_MESSAGE = "Usage: python linker.py out.hack file.asm|file.obj [file.asm|file.obj ...]"
+
+
+def main():
+    # Check for proper usage
+    if len(sys.argv) < 3:
+        print("Incorrect number of arguments")
+        sys.exit(EXIT_MESSAGE)
+
+    out_file_name = sys.argv[1]
+    try:
+        words = link([load_unit(file_name) for file_name in sys.argv[2:]])
+    except ValueError as error:
+        sys.exit(str(error))
+
+    # A .bin output file gets the packed binary format, anything else gets .hack text
+    if os.path.splitext(out_file_name)[1] == '.' + rom.ROM_EXTENSION:
+        rom.write_rom(words, out_file_name)
+    else:
+        with open(out_file_name, 'w') as out:
+            for word in words:
+                out.write(word_to_binary(word) + '\n')
+
+
+def assemble_object(asm_file_name):
+    """
+    Assembles one .asm unit into a relocatable object.
+    Word indexes and label addresses are relative to the start of the unit.
+    References to the unit's own labels are resolved here, and the indexes of those
+    words are listed as relocations, to be offset by the unit's ROM address when linked.
+    Only the exported labels (see is_exported) can be referenced from other units.
+    Any other symbol is left as a reference: the linker binds it to a label exported
+    by another unit, or allocates it as a variable.
+
+    Returns:
+        tuple (array('H'), dict, list, list, list)
+        (words, label -> relative address, [exported label],
+         [index of a word holding a relative address], [(word index, symbol)])
+    """
+    with open(asm_file_name) as file:
+        words, labels, chunk_references = assemble_chunk(file)
+
+    relocations = []
+    references = []
+    for index, symbol in chunk_references:
+        if symbol in labels:
+            words[index] = a_instruction(labels[symbol])
+            relocations.append(index)
+        else:
+            references.append((index, symbol))
+    exports = [label for label in labels if is_exported(label)]
+    return (words, labels, exports, relocations, references)
+
+
+def is_exported(label):
+    """
+    Returns True if label is visible to other units.
+    These are the function entries written by the VM translator, such as Main.main,
+    which contain a '.' but no '$'. Generated labels such as END, Main.main$ret.0,
+    $call or eqTrue0 stay local to their unit.
+    """
+    return '.' in label and '$' not in label
+
+
+def write_object(unit, obj_file_name):
+    """
+    Writes an object returned by assemble_object to obj_file_name
+    """
+    words, labels, exports, relocations, references = unit
+    with open(obj_file_name, 'w') as out:
+        json.dump({
+            'words': words.tolist(),
+            'labels': labels,
+            'exports': exports,
+            'relocations': relocations,
+            'references': references
+        }, out)
+
+
+def read_object(obj_file_name):
+    """
+    Reads an object file written by write_object
+
+    Returns: tuple (array('H'), dict, list, list, list), as assemble_object
+    """
+    with open(obj_file_name) as file:
+        obj = json.load(file)
+    references = [(index, symbol) for index, symbol in obj['references']]
+    return (array('H', obj['words']), obj['labels'], obj['exports'], obj['relocations'], references)
+
+
+def load_unit(file_name):
+    """
+    Returns the object for a .asm or .obj file.
+    A .asm file is only reassembled when its .obj file is missing or older than
+    the source, so unchanged units are assembled once and reused.
+    """
+    base, extension = os.path.splitext(file_name)
+    if extension != '.asm':
+        return read_object(file_name)
+
+    obj_file_name = base + '.' + OBJECT_EXTENSION
+    if (os.path.exists(obj_file_name)
+            and os.path.getmtime(obj_file_name) >= os.path.getmtime(file_name)):
+        try:
+            return read_object(obj_file_name)
+        except KeyError:
+            # Written in an older object format, so it is rebuilt
+            pass
+
+    unit = assemble_object(file_name)
+    write_object(unit, obj_file_name)
+    return unit
+
+
+def link(units, symbol_map=None):
+    """
+    Links objects, in the order given, into the final program.
+    The first unit is placed at ROM address 0 and each following unit directly after
+    the one before it. Relocated words are offset by the address of their unit, and
+    references are bound to exported labels. References to anything else are variables,
+    allocated from SYMBOL_MEM_INDEX_START in the order of their first use.
+    If a SymbolMap is given, the labels and variables of the program are recorded in it.
+    Local labels are recorded too, the first unit's taking precedence for a shared name.
+    Raises ValueError if two units export the same label, or if a unit references
+    a label which another unit defines but does not export.
+
+    Returns: array('H') of machine words, one per instruction
+    """
+    units = list(units)
+    exported = {}
+    # Labels which are only visible inside their unit, so references to them are errors
+    local_labels = set()
+    bases = []
+    base = 0
+    for words, labels, exports, relocations, references in units:
+        for label in exports:
+            if label in exported:
+                raise ValueError(f"Label {label} is exported by more than one unit")
+            exported[label] = base + labels[label]
+        local_labels.update(labels)
+        if symbol_map is not None:
+            for label, address in labels.items():
+                symbol_map.labels.setdefault(label, base + address)
+        bases.append(base)
+        base += len(words)
+
+    program = array('H')
+    variables = {}
+    for base, (words, labels, exports, relocations, references) in zip(bases, units):
+        program.extend(words)
+        for index in relocations:
+            program[base + index] = a_instruction(base + words[index])
+        for index, symbol in references:
+            address = exported.get(symbol)
+            if address is None and symbol in local_labels:
+                raise ValueError(f"Label {symbol} is not exported by the unit which defines it")
+            if address is None:
+                address = variables.setdefault(symbol, SYMBOL_MEM_INDEX_START + len(variables))
+            program[base + index] = a_instruction(address)
+
+    if symbol_map is not None:
+        symbol_map.variables.update(variables)
+    return program
+
+
+if __name__ == "__main__":
+    main()
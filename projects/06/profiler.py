@@ -0,0 +1,214 @@
+import os
+import sys
+import time
+import numpy as np
+from bisect import bisect_right
+import code
+from assembler import assemble
+from asmparser import ASMParser as Parser
+from block_emulator import BlockEmulator
+from emulator import Emulator, load_program, ROM_SIZE
+from symbol_map import SymbolMap, read_symbol_map, SYMBOL_MAP_EXTENSION
+
+EXIT_MESSAGE = "Usage: python profiler.py file.asm|file.hack|file.bin cycles [out.folded]"
+
+# Number of labels and functions listed in the report
+TOP_COUNT = 20
+# Name of the code before the first function, such as the bootstrap
+NO_FUNCTION = "(bootstrap)"
+
+
+def main():
+    # Check for proper usage
+    if len(sys.argv) not in [3, 4]:
+        print("Incorrect number of arguments")
+        sys.exit(EXIT_MESSAGE)
+
+    words, labels = load_profile_program(sys.argv[1])
+    emulator = ProfilingEmulator(words)
+    emulator.run(int(sys.argv[2]))
+    profile = Profile(emulator.address_cycles(), labels)
+    print(profile.report(), end="")
+    if len(sys.argv) == 4:
+        profile.write_collapsed(sys.argv[3])
+
+
+def load_profile_program(file_name):
+    """
+    Returns the words and the label map of a program.
+    A .asm file is assembled in memory. A .hack or .bin file needs the .sym file
+    written next to it by the assembler's --symbols option.
+
+    Returns: tuple (words, dict of label -> ROM address)
+    """
+    base, extension = os.path.splitext(file_name)
+    if extension == '.asm':
+        symbol_map = SymbolMap()
+        words = assemble(Parser(file_name), code.Code(), symbol_map=symbol_map)
+        return (words, symbol_map.labels)
+    return (load_program(file_name), read_symbol_map(base + '.' + SYMBOL_MAP_EXTENSION).labels)
+
+
+class ProfilingEmulator(BlockEmulator):
+    """
+    BlockEmulator which counts the cycles executed at every ROM address.
+    Only block entries are counted while running, since every instruction of a block
+    runs each time it is entered. address_cycles() expands the entries into per-address
+    counts with a difference array.
+    """
+    def invalidate(self):
+        # Counts of the old blocks are folded in before their lengths are lost
+        if hasattr(self, 'entries'):
+            self.cycle_counts += self.block_cycles()
+        else:
+            self.cycle_counts = np.zeros(ROM_SIZE, dtype=np.int64)
+        self.entries = [0] * ROM_SIZE
+        BlockEmulator.invalidate(self)
+
+
+    def run(self, cycles):
+        """
+        Executes cycles instructions, a block at a time, counting block entries.
+        The remainder which is shorter than the next block is single-stepped and
+        counted per address.
+
+        Returns: int, the number of cycles executed
+        """
+        blocks = self.blocks
+        entries = self.entries
+        mem = self.mem
+        a = self.a
+        d = self.d
+        pc = self.pc
+        remaining = cycles
+        start = time.perf_counter()
+
+        while True:
+            block = blocks[pc]
+            if block is None:
+                block = blocks[pc] = self.compile_block(pc)
+            function, length = block
+            if length > remaining:
+                break
+            entries[pc] += 1
+            a, d, pc = function(mem, a, d)
+            remaining -= length
+
+        self.elapsed += time.perf_counter() - start
+        self.a = a
+        self.d = d
+        self.pc = pc
+        self.cycles += cycles - remaining
+        for _ in range(remaining):
+            self.cycle_counts[self.pc] += 1
+            Emulator.run(self, 1)
+        return cycles
+
+
+    def block_cycles(self):
+        """
+        Returns the cycles counted through the entries of the current blocks, per address
+        """
+        difference = np.zeros(ROM_SIZE + 1, dtype=np.int64)
+        for start, count in enumerate(self.entries):
+            if count:
+                length = self.blocks[start][1]
+                difference[start] += count
+                difference[start + length] -= count
+        return np.cumsum(difference[:-1])
+
+
+    def address_cycles(self):
+        """
+        Returns the number of cycles executed at each ROM address, as an int64 array
+        """
+        return self.cycle_counts + self.block_cycles()
+
+
+class Profile():
+    """
+    Cycle counts of a program aggregated per label and per VM function.
+    An address belongs to the closest label at or before it. Functions are the
+    regions which start at a label for which is_function is true.
+    """
+    def __init__(self, cycles, labels):
+        self.cycles = cycles
+        self.label_cycles = region_cycles(cycles, labels)
+        functions = {label: address for label, address in labels.items() if is_function(label)}
+        self.function_cycles = region_cycles(cycles, functions)
+        # Cycles per (function, label) pair, for the collapsed stacks
+        self.stacks = {}
+        function_starts = sorted((address, name) for name, address in functions.items())
+        start_addresses = [address for address, _ in function_starts]
+        for label, label_total in self.label_cycles.items():
+            index = bisect_right(start_addresses, labels.get(label, 0)) - 1
+            function = function_starts[index][1] if index >= 0 else NO_FUNCTION
+            self.stacks[(function, label)] = label_total
+
+
+    def report(self):
+        """
+        Returns the hottest labels and functions as text
+        """
+        total = int(self.cycles.sum())
+        lines = [f"Total cycles: {total}\n", "\nHottest labels:\n"]
+        lines.extend(format_rows(self.label_cycles, total))
+        lines.append("\nHottest functions:\n")
+        lines.extend(format_rows(self.function_cycles, total))
+        return "".join(lines)
+
+
+    def write_collapsed(self, out_file_name):
+        """
+        Writes the cycles as collapsed stacks, function;label count, one per line,
+        for flamegraph tools
+        """
+        with open(out_file_name, 'w') as out:
+            for (function, label), count in self.stacks.items():
+                if count:
+                    frames = function if function == label else f"{function};{label}"
+                    out.write(f"{frames} {count}\n")
+
+
+def is_function(label):
+    """
+    Returns True if label starts a region of the function report. These are the
+    function entries written by the VM translator, which contain a '.' but no '$',
+    such as Main.main, and the code it places after the last function: the END loop
+    and the shared routines such as $call and $eq, so their cycles are not counted
+    under that function.
+    """
+    if label.startswith('$'):
+        return '.' not in label
+    return label == 'END' or ('.' in label and '$' not in label)
+
+
+def region_cycles(cycles, labels):
+    """
+    Sums cycles over the region of each label, from its address up to the next label.
+    Code before the first label is counted under NO_FUNCTION.
+
+    Returns: dict of label -> cycles
+    """
+    starts = sorted((address, label) for label, address in labels.items())
+    totals = np.concatenate([[0], np.cumsum(cycles)])
+    regions = {}
+    if not starts or starts[0][0] > 0:
+        regions[NO_FUNCTION] = int(totals[starts[0][0] if starts else len(cycles)])
+    for index, (address, label) in enumerate(starts):
+        end = starts[index + 1][0] if index + 1 < len(starts) else len(cycles)
+        regions[label] = int(totals[end] - totals[address])
+    return regions
+
+
+def format_rows(region_totals, total):
+    """
+    Returns the TOP_COUNT largest regions as report lines
+    """
+    rows = sorted(region_totals.items(), key=lambda item: item[1], reverse=True)[:TOP_COUNT]
+    return [f"{count:>14} {100 * count / total if total else 0:6.2f}%  {name}\n"
+            for name, count in rows if count]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import mmap
+import os
+import sys
+from array import array
+
+# Binary ROM files hold each instruction as a little-endian unsigned 16 bit word
+ROM_EXTENSION = 'bin'
+
+
+def write_rom(words, out_file_name):
+    """
+    Writes the instruction words to out_file_name as packed little-endian uint16 values
+    """
+    rom = array('H', words)
+    if sys.byteorder != 'little':
+        rom.byteswap()
+    with open(out_file_name, 'wb') as out:
+        rom.tofile(out)
+
+
+def read_rom(in_file_name):
+    """
+    Memory-maps a binary ROM file written by write_rom
+
+    Returns: memoryview of the instruction words, format 'H'
+    On little-endian machines the view is backed directly by the mapped file
+    """
+    with open(in_file_name, 'rb') as file:
+        # mmap cannot map an empty file
+        if file.seek(0, 2) == 0:
+            return memoryview(b'').cast('H')
+        if file.tell() % 2 != 0:
+            raise ValueError(f"{in_file_name} is not a ROM file. Size must be a whole number of 16 bit words.")
+        rom_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if sys.byteorder != 'little':
+        rom = array('H')
+        rom.frombytes(rom_map)
+        rom.byteswap()
+        rom_map.close()
+        return memoryview(rom)
+    return memoryview(rom_map).cast('H')
+
+
+def read_words(file_name):
+    """
+    Reads the machine words of a .bin ROM file or a .hack text file
+    """
+    if os.path.splitext(file_name)[1] == '.' + ROM_EXTENSION:
+        return read_rom(file_name)
+    with open(file_name) as file:
+        return [int(line, 2) for line in file if line.strip()]
@@ -0,0 +1,133 @@
+import os
+import struct
+import sys
+import zlib
+import numpy as np
+from block_emulator import BlockEmulator
+from emulator import load_program, SCREEN, KBD
+
+EXIT_MESSAGE = "Usage: python screen.py file.hack|file.bin|file.asm cycles out_dir [every] [--pbm]"
+
+# The screen is 256 rows of 512 pixels, 32 words per row
+SCREEN_ROWS = 256
+SCREEN_COLUMNS = 512
+
+
+def main():
+    # Check for proper usage
+    args = [arg for arg in sys.argv[1:] if arg != '--pbm']
+    if len(args) not in [3, 4]:
+        print("Incorrect number of arguments")
+        sys.exit(EXIT_MESSAGE)
+    image_format = 'pbm' if '--pbm' in sys.argv else 'png'
+
+    emulator = BlockEmulator(load_program(args[0]))
+    capture = ScreenCapture(emulator, args[2], image_format)
+    if len(args) == 4:
+        capture.run(int(args[1]), int(args[3]))
+    else:
+        emulator.run(int(args[1]))
+    capture.dump()
+    print(f"{len(capture.files)} screen dumps written to {args[2]}")
+
+
+def screen_words(ram):
+    """
+    Returns the screen memory of ram as a 256x32 array of words, sharing memory with ram
+    """
+    return ram[SCREEN:KBD].reshape(SCREEN_ROWS, SCREEN_COLUMNS // 16)
+
+
+def screen_bits(ram):
+    """
+    Unpacks the screen memory of ram into a 256x512 array of pixels, 1 for black.
+    The leftmost pixel of each group of 16 is the least significant bit of its word.
+    """
+    words = screen_words(ram)
+    if sys.byteorder != 'little':
+        words = words.astype('<u2')
+    return np.unpackbits(words.view(np.uint8), axis=1, bitorder='little')
+
+
+def write_pbm(bits, out_file_name):
+    """
+    Writes a 256x512 pixel array as a binary PBM image
+    """
+    with open(out_file_name, 'wb') as out:
+        out.write(f"P4\n{SCREEN_COLUMNS} {SCREEN_ROWS}\n".encode('ascii'))
+        out.write(np.packbits(bits, axis=1).tobytes())
+
+
+def write_png(bits, out_file_name):
+    """
+    Writes a 256x512 pixel array as a 1 bit grayscale PNG image
+    """
+    # In grayscale 0 is black, so the pixels are inverted
+    rows = np.packbits(1 - bits, axis=1)
+    # Each row starts with filter type 0
+    raw = np.hstack([np.zeros((SCREEN_ROWS, 1), dtype=np.uint8), rows]).tobytes()
+    with open(out_file_name, 'wb') as out:
+        out.write(b'\x89PNG\r\n\x1a\n')
+        out.write(png_chunk(b'IHDR', struct.pack('>IIBBBBB', SCREEN_COLUMNS, SCREEN_ROWS, 1, 0, 0, 0, 0)))
+        out.write(png_chunk(b'IDAT', zlib.compress(raw)))
+        out.write(png_chunk(b'IEND', b''))
+
+
+def png_chunk(chunk_type, data):
+    """
+    Returns a PNG chunk holding data
+    """
+    return (struct.pack('>I', len(data)) + chunk_type + data
+            + struct.pack('>I', zlib.crc32(chunk_type + data)))
+
+
+class ScreenCapture():
+    """
+    Writes the screen of an emulator to numbered image files in out_dir.
+    A dump is skipped when the screen memory is the same as at the last dump.
+    files lists the images written so far.
+    """
+    def __init__(self, emulator, out_dir, image_format='png'):
+        if image_format not in ['png', 'pbm']:
+            raise ValueError("Image format must be png or pbm")
+        self.emulator = emulator
+        self.out_dir = out_dir
+        self.image_format = image_format
+        self.last_screen = None
+        self.files = []
+        os.makedirs(out_dir, exist_ok=True)
+
+
+    def dump(self):
+        """
+        Writes the current screen, named after the emulator's cycle count
+
+        Returns: the file name, or None if the screen has not changed
+        """
+        words = screen_words(self.emulator.ram)
+        if self.last_screen is not None and np.array_equal(words, self.last_screen):
+            return None
+        self.last_screen = words.copy()
+
+        out_file_name = os.path.join(self.out_dir, f"screen_{self.emulator.cycles:010d}.{self.image_format}")
+        if self.image_format == 'png':
+            write_png(screen_bits(self.emulator.ram), out_file_name)
+        else:
+            write_pbm(screen_bits(self.emulator.ram), out_file_name)
+        self.files.append(out_file_name)
+        return out_file_name
+
+
+    def run(self, cycles, every):
+        """
+        Runs the emulator for cycles cycles, dumping the screen every every cycles
+        """
+        while cycles > 0:
+            step = min(every, cycles)
+            self.emulator.run(step)
+            cycles -= step
+            self.dump()
+
+
+if __name__ == "__main__":
+    main()
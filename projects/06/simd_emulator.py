@@ -0,0 +1,152 @@
+import sys
+import time
+import numpy as np
+from emulator import (decode, load_program, RAM_SIZE, ROM_SIZE, KBD, ADDRESS_MASK,
+                      JUMP_IF_ZERO, JUMP_IF_POSITIVE, JUMP_IF_NEGATIVE)
+
+EXIT_MESSAGE = ("Usage: python simd_emulator.py file.hack|file.bin|file.asm cycles "
+                "address=start:stop [address=start:stop ...] [--ram=words]")
+
+
+def main():
+    # Check for proper usage
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--ram=')]
+    ram_sizes = [int(arg[len('--ram='):]) for arg in sys.argv[1:] if arg.startswith('--ram=')]
+    if len(args) < 3:
+        print("Incorrect number of arguments")
+        sys.exit(EXIT_MESSAGE)
+
+    inputs = {}
+    for arg in args[2:]:
+        address, value_range = arg.split('=')
+        start, stop = value_range.split(':')
+        inputs[int(address)] = range(int(start), int(stop))
+
+    emulator = sweep(load_program(args[0]), int(args[1]), inputs,
+                     ram_sizes[-1] if ram_sizes else RAM_SIZE)
+    print(f"{emulator.instances} instances x {emulator.cycles} cycles in {emulator.elapsed:.3f} s "
+          f"({emulator.cycles_per_second():.0f} instance cycles/s)")
+
+
+def sweep(words, cycles, inputs, ram_size=RAM_SIZE):
+    """
+    Runs words once for every combination of the input values.
+    inputs maps a RAM address to the values it is swept over. Instance i gets the
+    i-th combination, with the last address varying fastest.
+
+    Returns: SIMDEmulator, after running cycles cycles
+    """
+    addresses = list(inputs)
+    grids = np.meshgrid(*[np.asarray(inputs[address]) for address in addresses], indexing='ij')
+    instances = grids[0].size if grids else 1
+    emulator = SIMDEmulator(words, instances, ram_size)
+    for address, grid in zip(addresses, grids):
+        emulator.ram[address] = grid.ravel()
+    emulator.run(cycles)
+    return emulator
+
+
+class SIMDEmulator():
+    """
+    Runs many instances of one program in lockstep, each with its own RAM and registers.
+    ram is a ram_size x instances uint16 NumPy array, one column per instance, and
+    a, d and pc hold one value per instance. Every cycle, the instances are grouped
+    by PC and each instruction is executed once for its whole group, so instances
+    which took different branches are masked apart until they meet again.
+    RAM beyond ram_size is not allocated, which keeps large sweeps of programs
+    that only use low memory small. Writes to KBD are ignored, as in Emulator.
+    """
+    def __init__(self, words, instances, ram_size=RAM_SIZE):
+        words = list(words)
+        if len(words) > ROM_SIZE:
+            raise ValueError(f"Program has {len(words)} instructions, ROM holds {ROM_SIZE}")
+        self.program = [decode(word) for word in words] + [0] * (ROM_SIZE - len(words))
+        self.instances = instances
+        self.ram = np.zeros((ram_size, instances), dtype=np.uint16)
+        self.a = np.zeros(instances, dtype=np.uint16)
+        self.d = np.zeros(instances, dtype=np.uint16)
+        self.pc = np.zeros(instances, dtype=np.uint16)
+        self.cycles = 0
+        self.elapsed = 0.0
+
+
+    def run(self, cycles):
+        """
+        Executes cycles instructions on every instance
+
+        Returns: int, the number of cycles executed
+        """
+        everyone = np.arange(self.instances)
+        start = time.perf_counter()
+
+        for _ in range(cycles):
+            pc = self.pc
+            if (pc == pc[0]).all():
+                self.step(int(pc[0]), everyone)
+                continue
+            # Diverged: one masked step per distinct PC
+            order = np.argsort(pc, kind='stable')
+            boundaries = np.flatnonzero(np.diff(pc[order])) + 1
+            for group in np.split(order, boundaries):
+                self.step(int(pc[group[0]]), group)
+
+        self.elapsed += time.perf_counter() - start
+        self.cycles += cycles
+        return cycles
+
+
+    def step(self, pc, group):
+        """
+        Executes the instruction at pc for the instances listed in group
+        """
+        inst = self.program[pc]
+        next_pc = (pc + 1) & ADDRESS_MASK
+        if inst.__class__ is int:
+            self.a[group] = inst
+            self.pc[group] = next_pc
+            return
+
+        reads_m, alu, dest_a, dest_d, dest_m, jump = inst
+        a = self.a[group]
+        address = a & ADDRESS_MASK
+        # Constant comps return a Python int, which is spread over the group
+        out = np.broadcast_to(alu(self.d[group], self.ram[address, group] if reads_m else a),
+                              group.shape).astype(np.uint16)
+        if dest_m:
+            writable = address != KBD
+            self.ram[address[writable], group[writable]] = out[writable]
+        if dest_d:
+            self.d[group] = out
+        if dest_a:
+            self.a[group] = out
+        if jump:
+            # The jump target is the value A held before this instruction
+            taken = np.zeros(group.shape, dtype=bool)
+            if jump & JUMP_IF_ZERO:
+                taken |= out == 0
+            if jump & JUMP_IF_NEGATIVE:
+                taken |= out >= 0x8000
+            if jump & JUMP_IF_POSITIVE:
+                taken |= (out != 0) & (out < 0x8000)
+            self.pc[group] = np.where(taken, address, next_pc)
+        else:
+            self.pc[group] = next_pc
+
+
+    def signed_ram(self):
+        """
+        Returns RAM viewed as int16 values, sharing memory with ram
+        """
+        return self.ram.view(np.int16)
+
+
+    def cycles_per_second(self):
+        """
+        Returns the average number of instructions executed per second over all
+        instances and all calls to run()
+        """
+        return self.cycles * self.instances / self.elapsed if self.elapsed else 0.0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import struct
+import sys
+import zlib
+import numpy as np
+from block_emulator import BlockEmulator
+from emulator import load_program, RAM_SIZE
+
+EXIT_MESSAGE = "Usage: python snapshot.py file.hack|file.bin|file.asm cycles out.snap [in.snap]"
+
+# magic, version, A, D, PC, CRC-32 of the ROM, cycle count
+HEADER = struct.Struct('<4sHHHHIQ')
+MAGIC = b'HSNP'
+VERSION = 1
+
+
+def main():
+    # Check for proper usage
+    if len(sys.argv) not in [4, 5]:
+        print("Incorrect number of arguments")
+        sys.exit(EXIT_MESSAGE)
+
+    emulator = BlockEmulator(load_program(sys.argv[1]))
+    if len(sys.argv) == 5:
+        load_snapshot(emulator, sys.argv[4])
+    emulator.run(int(sys.argv[2]))
+    save_snapshot(emulator, sys.argv[3])
+    print(f"Saved state after {emulator.cycles} cycles to {sys.argv[3]}")
+
+
+def rom_checksum(emulator):
+    """
+    Returns the CRC-32 of the emulator's ROM, so a snapshot is only resumed on its own program
+    """
+    return zlib.crc32(emulator.rom.astype('<u2').tobytes())
+
+
+def save_snapshot(emulator, out_file_name):
+    """
+    Writes A, D, PC, the cycle count and RAM to out_file_name.
+    RAM follows the header as little-endian uint16 words.
+    """
+    ram = emulator.ram
+    if sys.byteorder != 'little':
+        ram = ram.astype('<u2')
+    with open(out_file_name, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, VERSION, emulator.a, emulator.d, emulator.pc,
+                              rom_checksum(emulator), emulator.cycles))
+        ram.tofile(out)
+
+
+def load_snapshot(emulator, in_file_name):
+    """
+    Restores the state saved by save_snapshot into emulator.
+    RAM is memory-mapped copy-on-write, so restoring does not read the file and
+    writes made afterwards never reach it.
+    Raises ValueError if the snapshot was taken with a different ROM.
+    """
+    with open(in_file_name, 'rb') as file:
+        header = file.read(HEADER.size)
+    magic, version, a, d, pc, checksum, cycles = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{in_file_name} is not a version {VERSION} snapshot")
+    if checksum != rom_checksum(emulator):
+        raise ValueError(f"{in_file_name} was saved with a different program")
+
+    if sys.byteorder == 'little':
+        ram = np.memmap(in_file_name, dtype=np.uint16, mode='c', offset=HEADER.size, shape=(RAM_SIZE,))
+    else:
+        ram = np.fromfile(in_file_name, dtype='<u2', offset=HEADER.size, count=RAM_SIZE).astype(np.uint16)
+    emulator.ram = ram
+    emulator.mem = memoryview(ram)
+    emulator.a = a
+    emulator.d = d
+    emulator.pc = pc
+    emulator.cycles = cycles
+
+
+if __name__ == "__main__":
+    main()
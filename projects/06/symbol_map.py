@@ -0,0 +1,54 @@
+import json
+
+# Symbol maps are written next to the assembled program
+SYMBOL_MAP_EXTENSION = 'sym'
+
+
+class SymbolMap():
+    """
+    Collects the symbols resolved by the assembler so that downstream tools can load
+    them instead of re-parsing the .asm file.
+    labels maps label -> ROM address and variables maps variable -> RAM address.
+    lines is None unless a source line index is wanted, in which case lines[n - 1] is
+    the ROM address of source line n, or None for lines without an instruction.
+    A label line maps to the address of the instruction after it.
+    """
+    def __init__(self, with_lines=False):
+        self.labels = {}
+        self.variables = {}
+        self.lines = [] if with_lines else None
+
+
+    def add_line(self, line, address):
+        """
+        Records that source line number line holds the instruction at ROM address
+        """
+        self.lines.extend([None] * (line - 1 - len(self.lines)))
+        self.lines.append(address)
+
+
+    def write(self, out_file_name):
+        """
+        Writes the symbol map as JSON
+        """
+        with open(out_file_name, 'w') as out:
+            json.dump({
+                'labels': self.labels,
+                'variables': self.variables,
+                'lines': self.lines
+            }, out, separators=(',', ':'))
+
+
+def read_symbol_map(in_file_name):
+    """
+    Reads a symbol map written by SymbolMap.write
+
+    Returns: SymbolMap
+    """
+    with open(in_file_name) as file:
+        obj = json.load(file)
+    symbol_map = SymbolMap()
+    symbol_map.labels = obj['labels']
+    symbol_map.variables = obj['variables']
+    symbol_map.lines = obj['lines']
+    return symbol_map
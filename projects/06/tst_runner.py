@@ -0,0 +1,337 @@
+import os
+import re
+import sys
+from emulator import Emulator, load_program
+
+EXIT_MESSAGE = "Usage: python tst_runner.py file.tst|directory [file.tst|directory ...]"
+
+# Scripts for other simulators which share the .tst extension
+SKIPPED_SUFFIXES = ['VME.tst']
+# Chips which the emulator can stand in for
+SUPPORTED_CHIPS = ['Computer.hdl']
+
+# An output-list entry: name, then an optional %format with left pad, width and right pad
+OUTPUT_ITEM = re.compile(r"^(?P<name>[^%]+)(%(?P<format>[BDSX])(?P<left>\d+)\.(?P<width>\d+)\.(?P<right>\d+))?$")
+# A variable with an index, such as RAM[256] or PC[]
+INDEXED_VARIABLE = re.compile(r"^(?P<name>\w+)\[(?P<index>\d*)\]$")
+
+
+def main():
+    # Check for proper usage
+    if len(sys.argv) < 2:
+        print("Incorrect number of arguments")
+        sys.exit(EXIT_MESSAGE)
+
+    failures = 0
+    for script in find_scripts(sys.argv[1:]):
+        try:
+            passed, message = TestScript(script).run()
+        except UnsupportedScript as error:
+            print(f"SKIP {script}: {error}")
+            continue
+        except (OSError, ValueError, KeyError) as error:
+            passed, message = (False, f"{type(error).__name__}: {error}")
+        if not passed:
+            failures += 1
+        print(f"{'PASS' if passed else 'FAIL'} {script}{': ' + message if message else ''}")
+
+    if failures:
+        sys.exit(f"{failures} test script(s) failed")
+
+
+def find_scripts(paths):
+    """
+    Returns the .tst files in paths, searching directories recursively
+    """
+    scripts = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dir_path, dir_names, file_names in os.walk(path):
+                dir_names.sort()
+                scripts.extend(os.path.join(dir_path, name) for name in sorted(file_names)
+                               if name.endswith('.tst')
+                               and not any(name.endswith(suffix) for suffix in SKIPPED_SUFFIXES))
+        else:
+            scripts.append(path)
+    return scripts
+
+
+class UnsupportedScript(Exception):
+    """
+    Raised when a script needs a simulator or command which the runner does not have
+    """
+
+
+def tokenize(text):
+    """
+    Splits a test script into words, quoted strings and the punctuation , ; ! { }
+    """
+    text = re.sub(r"/\*.*?\*/", " ", text, flags=re.DOTALL)
+    text = re.sub(r"//[^\n]*", " ", text)
+    return re.findall(r'"[^"]*"|[,;!{}]|[^\s,;!{}"]+', text)
+
+
+def parse(tokens):
+    """
+    Parses tokens into a list of commands.
+    A command is a list of words, or a tuple ('repeat', count, commands).
+    """
+    commands = []
+    command = []
+    while tokens:
+        token = tokens.pop(0)
+        if token == 'repeat' and not command:
+            if tokens[0] == '{':
+                raise UnsupportedScript("repeat without a count runs forever")
+            count = int(tokens.pop(0))
+            if tokens.pop(0) != '{':
+                raise ValueError("Expected { after repeat")
+            commands.append(('repeat', count, parse(tokens)))
+        elif token == '}':
+            break
+        elif token in [',', ';', '!']:
+            if command:
+                commands.append(command)
+            command = []
+        elif token == 'while' and not command:
+            raise UnsupportedScript("while loops are not supported")
+        else:
+            command.append(token)
+    if command:
+        commands.append(command)
+    return commands
+
+
+def to_signed(value):
+    """
+    Returns a 16 bit word as a signed integer
+    """
+    return value - 0x10000 if value & 0x8000 else value
+
+
+def parse_value(text):
+    """
+    Parses a value given to set, in decimal or with a %D, %X or %B prefix
+    """
+    if text.startswith('%X'):
+        return int(text[2:], 16)
+    elif text.startswith('%B'):
+        return int(text[2:], 2)
+    elif text.startswith('%D'):
+        return int(text[2:])
+    return int(text)
+
+
+class TestScript():
+    """
+    Runs a CPU emulator test script (.tst) on the native emulator and compares its
+    output with the script's compare-to file.
+    Supports load, output-file, compare-to, output-list, output, set, tick, tock,
+    ticktock, repeat and echo. Computer.hdl scripts of the hardware simulator are run
+    on the emulator as well, with ROM32K load, reset and the register variables.
+    """
+    def __init__(self, script):
+        self.script = script
+        self.dir = os.path.dirname(script)
+        self.emulator = Emulator()
+        self.time = 0
+        self.half_cycle = False
+        self.reset = 0
+        self.output_list = []
+        self.output_lines = []
+        self.output_file = None
+        self.compare_file = None
+
+
+    def run(self):
+        """
+        Executes the script, writes its output file and compares it
+
+        Returns: tuple (bool, str)
+        (True if the output matches, message describing the first difference)
+        """
+        with open(self.script) as file:
+            commands = parse(tokenize(file.read()))
+        self.execute(commands)
+
+        if self.output_file is not None:
+            with open(self.output_file, 'w') as out:
+                out.writelines(line + '\n' for line in self.output_lines)
+        if self.compare_file is None:
+            return (True, "no compare file")
+        with open(self.compare_file) as file:
+            expected = [line.rstrip() for line in file if line.strip()]
+        return compare(self.output_lines, expected)
+
+
+    def execute(self, commands):
+        for command in commands:
+            if command[0] == 'repeat':
+                _, count, body = command
+                # A loop of single cycles is run in one call to the emulator
+                if body == [['ticktock']] and not self.half_cycle:
+                    self.cycle(count)
+                else:
+                    for _ in range(count):
+                        self.execute(body)
+            else:
+                self.execute_command(command)
+
+
+    def execute_command(self, command):
+        name = command[0]
+        if name == 'load':
+            self.load(command[1])
+        elif name == 'ROM32K' and command[1] == 'load':
+            self.emulator.load(load_program(os.path.join(self.dir, command[2])))
+        elif name == 'output-file':
+            self.output_file = os.path.join(self.dir, command[1])
+        elif name == 'compare-to':
+            self.compare_file = os.path.join(self.dir, command[1])
+        elif name == 'output-list':
+            self.set_output_list(command[1:])
+        elif name == 'output':
+            self.output_lines.append(self.format_line(self.format_value))
+        elif name == 'set':
+            self.set(command[1], parse_value(command[2]))
+        elif name == 'tick':
+            self.half_cycle = True
+        elif name == 'tock':
+            self.half_cycle = False
+            self.cycle(1)
+        elif name == 'ticktock':
+            self.cycle(1)
+        elif name == 'echo':
+            print(" ".join(command[1:]).strip('"'))
+        else:
+            raise UnsupportedScript(f"unknown command {' '.join(command)}")
+
+
+    def load(self, file_name):
+        """
+        Loads a program, or accepts the Computer chip, which is the emulator itself
+        """
+        if file_name.endswith('.hdl'):
+            if file_name not in SUPPORTED_CHIPS:
+                raise UnsupportedScript(f"chip {file_name} needs the hardware simulator")
+            return
+        self.emulator.load(load_program(os.path.join(self.dir, file_name)))
+
+
+    def cycle(self, count):
+        """
+        Runs count clock cycles. While reset is set, the PC is cleared after each cycle.
+        """
+        if self.reset:
+            for _ in range(count):
+                self.emulator.run(1)
+                self.emulator.reset()
+        else:
+            self.emulator.run(count)
+        self.time += count
+
+
+    def set(self, variable, value):
+        emulator = self.emulator
+        match = INDEXED_VARIABLE.match(variable)
+        name = match.group('name') if match else variable
+        if name in ['RAM', 'RAM16K']:
+            emulator.ram[int(match.group('index'))] = value & 0xFFFF
+        elif name in ['A', 'ARegister']:
+            emulator.a = value & 0xFFFF
+        elif name in ['D', 'DRegister']:
+            emulator.d = value & 0xFFFF
+        elif name == 'PC':
+            emulator.pc = value & 0x7FFF
+        elif name == 'reset':
+            self.reset = value
+        else:
+            raise UnsupportedScript(f"cannot set {variable}")
+
+
+    def get(self, variable):
+        """
+        Returns the value of variable, with words as signed integers
+        """
+        emulator = self.emulator
+        match = INDEXED_VARIABLE.match(variable)
+        name = match.group('name') if match else variable
+        if name in ['RAM', 'RAM16K']:
+            return to_signed(int(emulator.ram[int(match.group('index'))]))
+        elif name in ['A', 'ARegister']:
+            return to_signed(emulator.a)
+        elif name in ['D', 'DRegister']:
+            return to_signed(emulator.d)
+        elif name == 'PC':
+            return emulator.pc
+        elif name == 'reset':
+            return self.reset
+        elif name == 'time':
+            return f"{self.time}{'+' if self.half_cycle else ''}"
+        raise UnsupportedScript(f"cannot output {variable}")
+
+
+    def set_output_list(self, items):
+        """
+        Parses output-list entries into (name, format, left pad, width, right pad)
+        Adds the header line to the output.
+        """
+        self.output_list = []
+        for item in items:
+            match = OUTPUT_ITEM.match(item)
+            if match is None:
+                raise UnsupportedScript(f"bad output-list entry {item}")
+            if match.group('format') is None:
+                self.output_list.append((match.group('name'), 'D', 1, 6, 1))
+            else:
+                self.output_list.append((match.group('name'), match.group('format'),
+                                         int(match.group('left')), int(match.group('width')),
+                                         int(match.group('right'))))
+        self.output_lines.append(self.format_line(format_header))
+
+
+    def format_line(self, format_item):
+        return "|" + "".join(format_item(*item) + "|" for item in self.output_list)
+
+
+    def format_value(self, name, value_format, left, width, right):
+        value = self.get(name)
+        if value_format == 'S':
+            text = str(value).ljust(width)
+        elif value_format == 'D':
+            text = str(value).rjust(width)
+        elif value_format == 'X':
+            text = f"{value & 0xFFFF:04X}"[-width:].rjust(width)
+        else:
+            text = f"{value & 0xFFFF:016b}"[-width:]
+        return " " * left + text + " " * right
+
+
+def format_header(name, value_format, left, width, right):
+    """
+    Returns the column header for an output-list entry, centered and cut to the column width
+    """
+    column = left + width + right
+    name = name[:column]
+    space = column - len(name)
+    return " " * (space // 2) + name + " " * (space - space // 2)
+
+
+def compare(output, expected):
+    """
+    Compares output lines with expected lines. A * in an expected line matches any character.
+
+    Returns: tuple (bool, str)
+    """
+    for number, (line, expected_line) in enumerate(zip(output, expected), 1):
+        line = line.rstrip()
+        if len(line) != len(expected_line) or any(
+                want != '*' and got != want for got, want in zip(line, expected_line)):
+            return (False, f"line {number} is {line!r}, expected {expected_line!r}")
+    if len(output) < len(expected):
+        return (False, f"output ended after {len(output)} of {len(expected)} lines")
+    return (True, "")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,44 @@
 from typing import Dict
 
+# Labels of the routines shared by every call site and return in shared_calls mode
+CALL_ROUTINE : str = "$call"
+RETURN_ROUTINE : str = "$return"
+# Jump taken by each comparison when it is true
+COMPARE_JUMPS : Dict[str, str] = {
+    "eq": "JEQ",
+    "gt": "JGT",
+    "lt": "JLT"
+}
+# Jump of each fused comparison and if-goto written by the VM optimizer
+BRANCH_JUMPS : Dict[str, str] = {
+    "if-eq": "JEQ",
+    "if-ne": "JNE",
+    "if-gt": "JGT",
+    "if-le": "JLE",
+    "if-lt": "JLT",
+    "if-ge": "JGE"
+}
+
+
+def count_instructions(code:str) -> int:
+    """
+    Returns the number of Hack instructions in an assembly string, skipping labels and comments
+    """
+    return sum(1 for line in code.splitlines()
+               if len(line.strip()) > 0 and not line.startswith("//") and not line.startswith("("))
+
 class CodeWriter:
     """
     Once initialized, the codewriter is used by calling the translate function with the parsed tokens.
     The translate function returns a string of hack assembly commands which are the translation of the
     vm stack machine tokens.
+    With shared_calls, call and return jump to one global routine each, which close() emits,
+    instead of inlining the frame handling at every call site and return.
+    With shared_compares, eq, gt and lt call one routine per operator in the same way.
     """
-    def __init__(self, verbose_flag:bool=False, stack_index:int=256) -> None:
-        # Logical jump labels are not reset
-        # (TODO: but we could make them reset by including filename in the label)
+    def __init__(self, verbose_flag:bool=False, stack_index:int=256, pop_pointer_temp_reg:str="R13",
+                 shared_calls:bool=False, shared_compares:bool=False) -> None:
+        # Logical jump labels restart in every file, since they include the filename
         self.eq_label : int = 0
         self.gt_label : int = 0
         self.lt_label : int = 0
@@ -26,13 +56,25 @@ class CodeWriter:
             "that":"THAT"
         }
         self.stack_index : int = stack_index
+        self.pop_pointer_temp_reg : str = pop_pointer_temp_reg
+        self.shared_calls : bool = shared_calls
+        self.shared_compares : bool = shared_compares
+        # Number of eq, gt and lt operations translated, for compare_report()
+        self.compare_sites : Dict[str, int] = {op: 0 for op in COMPARE_JUMPS}
 
 
     def new_file(self, filename:str) -> None:
         """
-        Updates filename when starting a new file for writing
+        Updates filename when starting a new file for writing.
+        Labels and return addresses only depend on the file, so files can be translated
+        in any order, or by separate CodeWriters, and give the same code.
         """
         self.filename = filename
+        self.eq_label = 0
+        self.gt_label = 0
+        self.lt_label = 0
+        self.return_label_id = 0
+        self.current_function = None
 
 
     def next_label(self, op:str) -> str:
@@ -53,11 +95,21 @@ class CodeWriter:
 
     def close(self):
         """
-        Returns assembly string to end the code with an infinite loop
-        """
-        return ("(END)\n"
-                "@END\n"
-                "0;JMP\n")
+        Returns assembly string to end the code with an infinite loop,
+        followed by the shared call and return routines in shared_calls mode
+        and the comparison routines used in shared_compares mode
+        """
+        code : str = ("(END)\n"
+                      "@END\n"
+                      "0;JMP\n")
+        if self.shared_calls:
+            code += self.write_call_routine()
+            code += self.write_return_routine()
+        if self.shared_compares:
+            for op, sites in self.compare_sites.items():
+                if sites > 0:
+                    code += self.write_compare_routine(op)
+        return code
 
 
     def bootstrap(self):
@@ -107,7 +159,10 @@ class CodeWriter:
              and (len(arg1) == 0 or len(arg2) == 0)):
              raise ValueError("Pop and push operations require both a segment argument and an index argument.")
 
-        if (op in ["label", "if-goto", "goto"] and len(arg1) == 0):
+        if op == "move" and (len(arg1.split()) != 2 or len(arg2.split()) != 2):
+            raise ValueError("Move operations require a source and a destination segment and index.")
+
+        if ((op in ["label", "if-goto", "goto"] or op in BRANCH_JUMPS) and len(arg1) == 0):
             raise ValueError("Label operation requires a label argument")
 
         # call the correct subroutine for a given operation
@@ -115,6 +170,8 @@ class CodeWriter:
             return self.write_pop(arg1, arg2)
         elif op == "push":
             return self.write_push(arg1, arg2)
+        elif op == "move":
+            return self.write_move(arg1, arg2)
         elif op in ["add", "sub", "neg", "eq", "gt", "lt", "and", "or", "not"]:
             return self.write_arithmetic_logical(op)
         elif op == "label":
@@ -123,6 +180,8 @@ class CodeWriter:
             return self.write_goto(arg1)
         elif op == "if-goto":
             return self.write_if_goto(arg1)
+        elif op in BRANCH_JUMPS:
+            return self.write_compare_branch(op, arg1)
         elif op == "call":
             return self.write_function_call(arg1, arg2)
         elif op == "function":
@@ -162,12 +221,31 @@ class CodeWriter:
         """
         Translates a VM function call into Hack assembly code
         """
-        return_address : str = f"{self.current_function}$ret.{self.get_return_id()}"
+        # Calls outside of a function take their return labels from the file
+        scope : str = self.current_function if self.current_function is not None else self.filename
+        return_address : str = f"{scope}$ret.{self.get_return_id()}"
 
         code : str = ""
         if self.verbose:
             code += f"// call function {function} with {n_args} args\n"
 
+        if self.shared_calls:
+            # R13 = function, R14 = nArgs, D = return address, then goto the call routine
+            code += (f"@{function}\n"
+                      "D=A\n"
+                      "@R13\n"
+                      "M=D\n"
+                     f"@{str(n_args)}\n"
+                      "D=A\n"
+                      "@R14\n"
+                      "M=D\n"
+                     f"@{return_address}\n"
+                      "D=A\n"
+                     f"@{CALL_ROUTINE}\n"
+                      "0;JMP\n"
+                     f"({return_address})\n")
+            return code
+
         #push return address // generate label and push it to stack
         code += (f"@{return_address}\n"
                  "D=A\n"
@@ -242,6 +320,18 @@ class CodeWriter:
         code : str = ""
         if self.verbose:
             code += "// return from function\n"
+        if self.shared_calls:
+            code += (f"@{RETURN_ROUTINE}\n"
+                      "0;JMP\n")
+            return code
+        return code + self.write_return_frame()
+
+
+    def write_return_frame(self) -> str:
+        """
+        Returns the assembly code which restores the caller's frame and jumps back to it
+        """
+        code : str = ""
         # frame = LCL // Frame is a temporary variable, say R14
         code += ("@LCL\n"
                  "D=M\n"
@@ -282,6 +372,55 @@ class CodeWriter:
         return code
 
 
+    def write_call_routine(self) -> str:
+        """
+        Returns the shared call routine used in shared_calls mode.
+        Call sites jump here with the function address in R13, nArgs in R14
+        and the return address in D.
+        """
+        code : str = ""
+        if self.verbose:
+            code += "// shared call routine\n"
+        code += f"({CALL_ROUTINE})\n"
+        #push return address, which the call site left in D
+        code += ("@SP\n"
+                 "M=M+1\n"
+                 "A=M-1\n"
+                 "M=D\n")
+        for adr in ["LCL", "ARG", "THIS", "THAT"]:
+            code += self.push(adr)
+        #ARG = SP - 5 - nArgs //reposition args
+        code += ("@R14\n"
+                 "D=M\n"
+                 "@5\n"
+                 "D=D+A\n"
+                 "@SP\n"
+                 "D=M-D\n"
+                 "@ARG\n"
+                 "M=D\n")
+        #LCL = SP //reposition LCL
+        code += ("@SP\n"
+                 "D=M\n"
+                 "@LCL\n"
+                 "M=D\n")
+        #goto function, whose address is in R13
+        code += ("@R13\n"
+                 "A=M\n"
+                 "0;JMP\n")
+        return code
+
+
+    def write_return_routine(self) -> str:
+        """
+        Returns the shared return routine used in shared_calls mode
+        """
+        code : str = ""
+        if self.verbose:
+            code += "// shared return routine\n"
+        code += f"({RETURN_ROUTINE})\n"
+        return code + self.write_return_frame()
+
+
     def get_function_name(self) -> str:
         """
         returns "filename.function_name" if both self.filename and self.function_name are not empty
@@ -332,6 +471,26 @@ class CodeWriter:
         return code
 
 
+    def write_compare_branch(self, op:str, label:str) -> str:
+        """
+        Writes assembly code which pops the top two stack items x and y and jumps to (label)
+        if the comparison of x with y given by op holds, such as x < y for if-lt.
+        This is a comparison followed by if-goto without the -1/0 result on the stack.
+        """
+        code :str = ""
+        if self.verbose:
+            code += f"//jump to ({self.current_function}${label}) if {op[3:]}\n"
+        code += ("@SP\n"
+                "AM=M-1\n"
+                "D=M\n"
+                "@SP\n"
+                "AM=M-1\n"
+                "D=M-D\n"
+                f"@{self.current_function}${label}\n"
+                f"D;{BRANCH_JUMPS[op]}\n")
+        return code
+
+
     def map_direct_seg(self, seg:str, idx:str) -> str:
         """
         Returns address call for direct segments
@@ -400,17 +559,7 @@ class CodeWriter:
         if self.verbose:
             code += f"//pop {seg} {idx}\n"
         seg_map = self.map_segment_pop(seg, idx)
-        # if the segment uses a base pointer, this calculates the resulting
-        # address and stores it in a temporary register (R13 by default)
-        if seg in ["local", "argument", "this", "that"]:
-            calc_pointer = (f"@{idx}\n"
-                             "D=A\n"
-                            f"@{self.seg_dict.get(seg)}\n"
-                             "D=D+M\n"
-                            f"@R13\n"
-                             "M=D\n")
-        else:
-            calc_pointer = ""
+        calc_pointer = self.calc_pop_pointer(seg, idx)
         code += (
                  f"{calc_pointer}"
                   "@SP\n"
@@ -421,6 +570,50 @@ class CodeWriter:
         return code
 
 
+    def calc_pop_pointer(self, seg:str, idx:str) -> str:
+        """
+        if the segment uses a base pointer, returns hack assembly string which calculates
+        the address of segment[index] and stores it in a temporary register (R13 by default)
+        """
+        if seg in self.seg_dict:
+            return (f"@{idx}\n"
+                     "D=A\n"
+                    f"@{self.seg_dict.get(seg)}\n"
+                     "D=D+M\n"
+                    f"@{self.pop_pointer_temp_reg}\n"
+                     "M=D\n")
+        return ""
+
+
+    def write_move(self, source:str, destination:str) -> str:
+        """
+        returns hack assembly string that copies source to destination without using the stack,
+        where both are "segment index", as push source followed by pop destination would
+        """
+        src_seg, src_idx = source.split()
+        dst_seg, dst_idx = destination.split()
+        code : str = ""
+        if self.verbose:
+            code += f"//move {source} to {destination}\n"
+
+        # The first two slots of a pointer segment are reached from its base without
+        # a temporary register
+        near_base : bool = dst_seg in self.seg_dict and int(dst_idx) <= 1
+        if not near_base:
+            code += self.calc_pop_pointer(dst_seg, dst_idx)
+        code += self.map_segment_push(src_seg, src_idx)
+        code += "D=A\n" if src_seg == "constant" else "D=M\n"
+        if near_base:
+            code += (f"@{self.seg_dict.get(dst_seg)}\n"
+                      "A=M\n")
+            if dst_idx == "1":
+                code += "A=A+1\n"
+        else:
+            code += self.map_segment_pop(dst_seg, dst_idx)
+        code += "M=D\n"
+        return code
+
+
     def write_push(self, seg:str, idx:str) -> str:
         """
         returns hack assembly string that pushes item at RAM segment[index] to top of stack
@@ -467,45 +660,8 @@ class CodeWriter:
             if self.verbose:
                 code += "//neg\n"
             code += "M=-M\n"
-        elif op == "eq":
-            label = self.next_label("eq")
-            code = self.pop_2()
-            if self.verbose:
-                code += "//eq\n"
-            code += ("D=M-D\n"
-                    "M=-1\n"
-                    f"@eqTrue{label}\n"
-                    "D;JEQ\n"
-                    "@SP\n"
-                    "A=M-1\n"
-                    "M=0\n"
-                    f"(eqTrue{label})\n")
-        elif op == "gt":
-            label = self.next_label("gt")
-            code = self.pop_2()
-            if self.verbose:
-                code += "//gt\n"
-            code += ("D=M-D\n"
-                    "M=-1\n"
-                    f"@gtTrue{label}\n"
-                    "D;JGT\n"
-                    "@SP\n"
-                    "A=M-1\n"
-                    "M=0\n"
-                    f"(gtTrue{label})\n")
-        elif op == "lt":
-            label = self.next_label("lt")
-            code = self.pop_2()
-            if self.verbose:
-                code += "//lt\n"
-            code += ("D=M-D\n"
-                    "M=-1\n"
-                    f"@ltTrue{label}\n"
-                    "D;JLT\n"
-                    "@SP\n"
-                    "A=M-1\n"
-                    "M=0\n"
-                    f"(ltTrue{label})\n")
+        elif op in COMPARE_JUMPS:
+            code = self.write_compare(op)
         elif op == "and":
             code = self.pop_2()
             if self.verbose:
@@ -525,6 +681,90 @@ class CodeWriter:
         return code
 
 
+    def write_compare(self, op:str) -> str:
+        """
+        Writes HACK assembly for eq, gt or lt, which replace the top two items
+        on the stack with -1 (true) or 0 (false)
+        """
+        self.compare_sites[op] += 1
+        label = self.next_label(op)
+        if self.shared_compares:
+            code : str = ""
+            if self.verbose:
+                code += f"//{op} through the shared routine\n"
+            # The return address is passed in D
+            code += (f"@{self.filename}${op}Return{label}\n"
+                      "D=A\n"
+                     f"@${op}\n"
+                      "0;JMP\n"
+                     f"({self.filename}${op}Return{label})\n")
+            return code
+
+        code = self.pop_2()
+        if self.verbose:
+            code += f"//{op}\n"
+        code += self.compare_body(op, f"{self.filename}${op}True{label}")
+        return code
+
+
+    def compare_body(self, op:str, true_label:str) -> str:
+        """
+        Returns the assembly which compares x (at A) with y (in D) and leaves the
+        result in place of x, jumping to true_label to keep -1
+        """
+        return ("D=M-D\n"
+                "M=-1\n"
+               f"@{true_label}\n"
+               f"D;{COMPARE_JUMPS[op]}\n"
+                "@SP\n"
+                "A=M-1\n"
+                "M=0\n"
+               f"({true_label})\n")
+
+
+    def write_compare_routine(self, op:str) -> str:
+        """
+        Returns the shared routine for eq, gt or lt used in shared_compares mode.
+        Use sites jump here with the return address in D.
+        """
+        code : str = ""
+        if self.verbose:
+            code += f"// shared {op} routine\n"
+        code += (f"(${op})\n"
+                  "@R15\n"
+                  "M=D\n"
+                  "@SP\n"
+                  "AM=M-1\n"
+                  "D=M\n"
+                  "A=A-1\n")
+        code += self.compare_body(op, f"${op}.true")
+        code += ("@R15\n"
+                 "A=M\n"
+                 "0;JMP\n")
+        return code
+
+
+    def compare_report(self) -> str:
+        """
+        Returns the ROM words taken by eq, gt and lt when inlined and when shared,
+        and the extra cycles each comparison costs through the shared routine
+        """
+        # Measured on throwaway writers, so the label counters are left alone
+        inline_writer = CodeWriter()
+        shared_writer = CodeWriter(shared_compares=True)
+        report : str = ""
+        for op, sites in self.compare_sites.items():
+            inline_words : int = count_instructions(inline_writer.write_compare(op))
+            site_words : int = count_instructions(shared_writer.write_compare(op))
+            routine_words : int = count_instructions(shared_writer.write_compare_routine(op))
+            shared_words : int = sites * site_words + (routine_words if sites > 0 else 0)
+            # Both versions skip the same instructions when the comparison is true
+            extra_cycles : int = site_words + routine_words - inline_words
+            report += (f"{op}: {sites} sites, {sites * inline_words} words inline, "
+                       f"{shared_words} words shared, +{extra_cycles} cycles per comparison when shared\n")
+        return report
+
+
     def pop_2(self) -> str:
         """
         returns assembly code string that pops top two items on stack into D and A registers
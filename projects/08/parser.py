@@ -58,6 +58,13 @@ class Parser:
                 self.line = ""
                 return False
 
+    def commands(self) -> Generator:
+        """
+        Generator which returns the remaining commands as (op, arg1, arg2) tuples
+        """
+        while self.advance():
+            yield (self.op, self.arg1, self.arg2)
+
     def parse_line(self, line:str) -> List[str]:
         """
         Parses a valid line and returns a list of tokens
@@ -0,0 +1,137 @@
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Lines kept in the window after the newest line, so earlier lines can still
+# take part in a match after a rewrite shrinks the tail
+WINDOW_SIZE : int = 16
+
+
+class PeepholeOptimizer:
+    """
+    Rewrites the Hack assembly emitted by the CodeWriter before it reaches the assembler.
+    Each rule looks at the last few instructions of a sliding window and returns
+    the lines to replace them with, or None if it does not apply. Rules never match
+    across a label, since a label is a line of its own and control can enter there.
+    Comments and blank lines are dropped. hits counts the rewrites made by each rule.
+    """
+    def __init__(self) -> None:
+        # (name, number of lines matched, rule)
+        self.rules : List[Tuple[str, int, Callable[[List[str]], Optional[List[str]]]]] = [
+            ("push_pop", 7, self.push_pop),
+            ("jump_to_next", 4, self.jump_to_next),
+            ("repeated_a_load", 3, self.repeated_a_load),
+            ("dead_a_load", 2, self.dead_a_load)
+        ]
+        self.hits : Dict[str, int] = {name: 0 for name, _, _ in self.rules}
+
+
+    def optimize(self, lines:Iterable[str]) -> Iterator[str]:
+        """
+        Generator which returns the optimized lines, without newlines
+        """
+        window : Deque[str] = deque()
+        for line in lines:
+            if "//" in line:
+                line = line[0:line.index("//")]
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            window.append(line)
+            self.rewrite_tail(window)
+            while len(window) > WINDOW_SIZE:
+                yield window.popleft()
+        yield from window
+
+
+    def rewrite_tail(self, window:Deque[str]) -> None:
+        """
+        Applies rules to the end of the window until none of them match
+        """
+        rewritten : bool = True
+        while rewritten:
+            rewritten = False
+            for name, size, rule in self.rules:
+                if len(window) < size:
+                    continue
+                tail : List[str] = [window[i] for i in range(len(window) - size, len(window))]
+                replacement = rule(tail)
+                if replacement is not None:
+                    for _ in range(size):
+                        window.pop()
+                    window.extend(replacement)
+                    self.hits[name] += 1
+                    rewritten = True
+                    break
+
+
+    def report(self) -> str:
+        """
+        Returns the number of rewrites made by each rule, one rule per line
+        """
+        return "".join(f"{name}: {count}\n" for name, count in self.hits.items())
+
+
+    def push_pop(self, tail:List[str]) -> Optional[List[str]]:
+        """
+        A push of D followed by a pop into D leaves SP and D unchanged.
+        Only the store to the top slot is kept, with A left pointing at that slot.
+        """
+        if tail == ["@SP", "M=M+1", "A=M-1", "M=D", "@SP", "AM=M-1", "D=M"]:
+            return ["@SP", "A=M", "M=D"]
+        return None
+
+
+    def jump_to_next(self, tail:List[str]) -> Optional[List[str]]:
+        """
+        A jump with no destination to the label directly after it does nothing.
+        The instruction after the label must load A, so that the A value left
+        by the removed jump is never read.
+        """
+        load, jump, label, after = tail
+        if (is_a_inst(load) and is_label(label) and load[1:] == label[1:-1]
+                and ";" in jump and "=" not in jump and is_a_inst(after)):
+            return [label, after]
+        return None
+
+
+    def repeated_a_load(self, tail:List[str]) -> Optional[List[str]]:
+        """
+        Loading A with the value it already holds is removed.
+        The instruction in between must be a C-instruction which does not write A.
+        """
+        first, inst, second = tail
+        if (is_a_inst(first) and first == second and is_c_inst(inst)
+                and "A" not in dest(inst)):
+            return [first, inst]
+        return None
+
+
+    def dead_a_load(self, tail:List[str]) -> Optional[List[str]]:
+        """
+        An A-instruction directly followed by another one is never read.
+        """
+        first, second = tail
+        if is_a_inst(first) and is_a_inst(second):
+            return [second]
+        return None
+
+
+def is_a_inst(line:str) -> bool:
+    return line[0] == "@"
+
+
+def is_label(line:str) -> bool:
+    return line[0] == "("
+
+
+def is_c_inst(line:str) -> bool:
+    return not is_a_inst(line) and not is_label(line)
+
+
+def dest(line:str) -> str:
+    """
+    Returns the dest part of a C-instruction, or an empty string if there is none
+    """
+    if "=" in line:
+        return line[0:line.index("=")]
+    return ""
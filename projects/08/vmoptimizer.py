@@ -0,0 +1,146 @@
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# A parsed VM command: (op, arg1, arg2)
+Command = Tuple[str, str, str]
+
+# Operations folded when both operands are constants
+FOLDED_OPS : Dict[str, Callable[[int, int], int]] = {
+    "add": lambda x, y: x + y,
+    "sub": lambda x, y: x - y,
+    "and": lambda x, y: x & y,
+    "or": lambda x, y: x | y
+}
+# Largest value push constant can take
+MAX_CONSTANT : int = 32767
+# Branch which replaces a comparison followed by if-goto, and by not then if-goto
+COMPARE_BRANCHES : Dict[str, str] = {
+    "eq": "if-eq",
+    "gt": "if-gt",
+    "lt": "if-lt"
+}
+INVERTED_BRANCHES : Dict[str, str] = {
+    "eq": "if-ne",
+    "gt": "if-le",
+    "lt": "if-ge"
+}
+
+
+class VMOptimizer:
+    """
+    Rewrites the parsed VM commands of a file before they reach the CodeWriter.
+    Commands are buffered one function at a time, and each rule looks at the last
+    few commands of the buffer and returns the commands to replace them with, or None
+    if it does not apply. Rules never match across a label, since a label is a
+    command of its own. Moves come out as ("move", "segment index", "segment index"),
+    which the CodeWriter translates without touching the stack, and fused comparisons
+    as (branch, label, ""), where branch is one of the values of COMPARE_BRANCHES and
+    INVERTED_BRANCHES.
+    hits counts the rewrites made by each rule.
+    """
+    def __init__(self) -> None:
+        # (name, number of commands matched, rule)
+        self.rules : List[Tuple[str, int, Callable[[List[Command]], Optional[List[Command]]]]] = [
+            ("fold_constants", 3, self.fold_constants),
+            ("inverted_compare_branch", 3, self.inverted_compare_branch),
+            ("compare_branch", 2, self.compare_branch),
+            ("push_pop_same", 2, self.push_pop_same),
+            ("direct_move", 2, self.direct_move)
+        ]
+        self.hits : Dict[str, int] = {name: 0 for name, _, _ in self.rules}
+
+
+    def optimize(self, commands:Iterable[Command]) -> Iterator[Command]:
+        """
+        Generator which returns the optimized commands
+        """
+        buffer : List[Command] = []
+        for command in commands:
+            # A new function starts a new buffer
+            if command[0] == "function":
+                yield from buffer
+                buffer = []
+            buffer.append(command)
+            self.rewrite_tail(buffer)
+        yield from buffer
+
+
+    def rewrite_tail(self, buffer:List[Command]) -> None:
+        """
+        Applies rules to the end of the buffer until none of them match
+        """
+        rewritten : bool = True
+        while rewritten:
+            rewritten = False
+            for name, size, rule in self.rules:
+                if len(buffer) < size:
+                    continue
+                replacement = rule(buffer[-size:])
+                if replacement is not None:
+                    del buffer[-size:]
+                    buffer.extend(replacement)
+                    self.hits[name] += 1
+                    rewritten = True
+                    break
+
+
+    def report(self) -> str:
+        """
+        Returns the number of rewrites made by each rule, one rule per line
+        """
+        return "".join(f"{name}: {count}\n" for name, count in self.hits.items())
+
+
+    def fold_constants(self, tail:List[Command]) -> Optional[List[Command]]:
+        """
+        push constant a; push constant b; add (or sub, and, or) becomes a single
+        push constant, if the result can be pushed as a constant
+        """
+        first, second, op = tail
+        if (first[0:2] == ("push", "constant") and second[0:2] == ("push", "constant")
+                and op[0] in FOLDED_OPS):
+            value : int = FOLDED_OPS[op[0]](int(first[2]), int(second[2]))
+            if 0 <= value <= MAX_CONSTANT:
+                return [("push", "constant", str(value))]
+        return None
+
+
+    def push_pop_same(self, tail:List[Command]) -> Optional[List[Command]]:
+        """
+        Popping a value back to where it was pushed from does nothing
+        """
+        push, pop = tail
+        if (push[0] == "push" and pop[0] == "pop" and push[1] != "constant"
+                and push[1:] == pop[1:]):
+            return []
+        return None
+
+
+    def direct_move(self, tail:List[Command]) -> Optional[List[Command]]:
+        """
+        push s i; pop t j becomes a move from s i to t j which skips the stack
+        """
+        push, pop = tail
+        if push[0] == "push" and pop[0] == "pop":
+            return [("move", f"{push[1]} {push[2]}", f"{pop[1]} {pop[2]}")]
+        return None
+
+
+    def compare_branch(self, tail:List[Command]) -> Optional[List[Command]]:
+        """
+        eq, gt or lt followed by if-goto jumps on the comparison directly,
+        without leaving -1 or 0 on the stack
+        """
+        compare, branch = tail
+        if compare[0] in COMPARE_BRANCHES and branch[0] == "if-goto":
+            return [(COMPARE_BRANCHES[compare[0]], branch[1], "")]
+        return None
+
+
+    def inverted_compare_branch(self, tail:List[Command]) -> Optional[List[Command]]:
+        """
+        eq, gt or lt followed by not and if-goto jumps on the opposite comparison
+        """
+        compare, invert, branch = tail
+        if compare[0] in INVERTED_BRANCHES and invert[0] == "not" and branch[0] == "if-goto":
+            return [(INVERTED_BRANCHES[compare[0]], branch[1], "")]
+        return None
@@ -1,16 +1,42 @@
 import parser
 import codewriter
+import peephole
+import vmoptimizer
 
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Dict, Generator, List, Optional, Tuple
 
-EXIT_MESSAGE : str = "Usage: python vmtranslator.py <file.vm or directory>"
+EXIT_MESSAGE : str = "Usage: python vmtranslator.py <file.vm or directory> [--optimize] [--optimize-vm] [--shared-calls] [--shared-compares] [--parallel]"
 # TODO: add error checking to catch overflow of memory segments
 
 def main():
+    # --optimize runs the generated assembly through the peephole optimizer
+    optimize : bool = "--optimize" in sys.argv
+    if optimize:
+        sys.argv.remove("--optimize")
+    # --optimize-vm rewrites the parsed VM commands before they are translated
+    optimize_vm : bool = "--optimize-vm" in sys.argv
+    if optimize_vm:
+        sys.argv.remove("--optimize-vm")
+    # --shared-calls replaces the inlined call and return code with two shared routines
+    shared_calls : bool = "--shared-calls" in sys.argv
+    if shared_calls:
+        sys.argv.remove("--shared-calls")
+    # --shared-compares does the same for eq, gt and lt, and prints a size/cycle report
+    shared_compares : bool = "--shared-compares" in sys.argv
+    if shared_compares:
+        sys.argv.remove("--shared-compares")
+    # --parallel translates the files of a directory on a process pool
+    parallel : bool = "--parallel" in sys.argv
+    if parallel:
+        sys.argv.remove("--parallel")
+
     # Check correct usage
     if len(sys.argv) == 1:
-        sys.argv[1] = os.getcwd()
+        sys.argv.append(os.getcwd())
     if len(sys.argv) > 2:
         print("Too many arguments arguments")
         sys.exit(EXIT_MESSAGE)
@@ -24,8 +50,9 @@ def main():
         # TODO: check that file is a .vm file
     elif os.path.isdir(sys.argv[1]):
         is_dir = True
-        # Make a list of filenames to drive the translation loop
-        files = [os.path.splitext(fname)[0] for fname in os.listdir(sys.argv[1]) if ".vm" in fname]
+        # Make a list of filenames to drive the translation loop, sorted so the output
+        # does not depend on the order of the directory listing
+        files = sorted(os.path.splitext(fname)[0] for fname in os.listdir(sys.argv[1]) if ".vm" in fname)
         # The output file when the arg is a directory is ./dirpath/.../topdirname/topdirname.asm
         if len(files) == 0:
             print("No .vm files were found in the target directory")
@@ -37,30 +64,101 @@ def main():
 
     # Instantiate codewriter without a filename - will use new file method to
     # update filename before writing code
-    my_codewriter = codewriter.CodeWriter(verbose_flag=True)
+    my_codewriter = codewriter.CodeWriter(verbose_flag=True, shared_calls=shared_calls,
+                                          shared_compares=shared_compares)
+    vm_optimizer = vmoptimizer.VMOptimizer() if optimize_vm else None
+    code = generate_code(my_codewriter, files, is_dir, vm_optimizer, parallel)
 
     # Translate and write into a .asm file
     with open(out_file_name, "w") as out:
-        # Write bootstrap code
-        out.write(my_codewriter.bootstrap())
-       
-        for file in files:
-            if is_dir:
-                in_file = os.path.join(sys.argv[1], file + ".vm")
-            else:
-                in_file = os.path.join(os.path.dirname(sys.argv[1]), file + ".vm")
-
-            # For each new file instantiate a new parser and set the codewriter to the new filename
-            my_parser = parser.Parser(in_file)
-            my_codewriter.new_file(file)
-
-            while my_parser.advance():
-                out.write(my_codewriter.translate(my_parser.op, my_parser.arg1, my_parser.arg2))
-                #print(my_codewriter.translate(my_parser.op, my_parser.arg1, my_parser.arg2), end="")
-        
-        # Write closing code
-        out.write(my_codewriter.close())
-        #print(my_codewriter.close(), end="")
+        if optimize:
+            optimizer = peephole.PeepholeOptimizer()
+            lines = (line for chunk in code for line in chunk.splitlines())
+            for line in optimizer.optimize(lines):
+                out.write(line + "\n")
+        else:
+            for chunk in code:
+                out.write(chunk)
+
+    if optimize_vm:
+        print(vm_optimizer.report(), end="")
+    if optimize:
+        print(optimizer.report(), end="")
+    if shared_compares:
+        print(my_codewriter.compare_report(), end="")
+
+
+def generate_code(my_codewriter:codewriter.CodeWriter, files:List[str], is_dir:bool,
+                  vm_optimizer:Optional[vmoptimizer.VMOptimizer]=None, parallel:bool=False) -> Generator:
+    """
+    Generator which returns the assembly code for the bootstrap, each file in files,
+    and the closing code, in that order.
+    The commands of each file pass through vm_optimizer first, if one is given.
+    With parallel, the files are translated on a process pool and come back in the
+    order of files, so the output is the same as a serial translation.
+    """
+    # Write bootstrap code
+    yield my_codewriter.bootstrap()
+
+    in_files : List[str] = [vm_file_path(file, is_dir) for file in files]
+    if parallel:
+        with ProcessPoolExecutor() as executor:
+            results = executor.map(translate_file_worker, repeat(my_codewriter), in_files, files,
+                                   repeat(vm_optimizer is not None))
+            for code, compare_sites, hits in results:
+                # Shared compare routines and reports need the counts of every file
+                for op, sites in compare_sites.items():
+                    my_codewriter.compare_sites[op] += sites
+                if vm_optimizer is not None:
+                    for name, count in hits.items():
+                        vm_optimizer.hits[name] += count
+                yield code
+    else:
+        for in_file, file in zip(in_files, files):
+            yield from translate_file(my_codewriter, in_file, file, vm_optimizer)
+
+    # Write closing code
+    yield my_codewriter.close()
+
+
+def vm_file_path(file:str, is_dir:bool) -> str:
+    """
+    Returns the path of the .vm file for a name in the list of files to translate
+    """
+    if is_dir:
+        return os.path.join(sys.argv[1], file + ".vm")
+    return os.path.join(os.path.dirname(sys.argv[1]), file + ".vm")
+
+
+def translate_file(my_codewriter:codewriter.CodeWriter, in_file:str, file:str,
+                   vm_optimizer:Optional[vmoptimizer.VMOptimizer]=None) -> Generator:
+    """
+    Generator which returns the assembly code for each command of one .vm file
+    """
+    # For each new file instantiate a new parser and set the codewriter to the new filename
+    my_parser = parser.Parser(in_file)
+    my_codewriter.new_file(file)
+
+    commands = my_parser.commands()
+    if vm_optimizer is not None:
+        commands = vm_optimizer.optimize(commands)
+    for op, arg1, arg2 in commands:
+        yield my_codewriter.translate(op, arg1, arg2)
+
+
+def translate_file_worker(my_codewriter:codewriter.CodeWriter, in_file:str, file:str,
+                          optimize_vm:bool) -> Tuple[str, Dict[str, int], Dict[str, int]]:
+    """
+    Translates one .vm file in a worker process, on the worker's own copy of the codewriter
+
+    Returns: tuple (assembly code, compare sites of the file, hits of the VM optimizer)
+    """
+    my_codewriter.compare_sites = {op: 0 for op in my_codewriter.compare_sites}
+    vm_optimizer = vmoptimizer.VMOptimizer() if optimize_vm else None
+    code : str = "".join(translate_file(my_codewriter, in_file, file, vm_optimizer))
+    hits : Dict[str, int] = vm_optimizer.hits if vm_optimizer is not None else {}
+    return (code, my_codewriter.compare_sites, hits)
+
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()